@@ -0,0 +1,203 @@
+"""
+Асинхронные представления для чтения справочников и рецептов.
+
+Подключаются в api/urls.py при ASYNC_VIEWS = True и работают при
+запуске через ASGI (uvicorn): ожидание базы не занимает воркер.
+Ответы совпадают с ответами вьюсетов DRF, запросы на изменение
+передаются синхронным вьюсетам.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import path
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from api.authentication import CachedTokenAuthentication
+from api.cache import entry_response, make_entry, response_key
+from api.filters import RecipeFilter
+from api.pagination import AsyncRecipePagination
+from api.serializers import (
+    IngredientSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.autocomplete import ingredient_index
+from recipes.membership import UserRecipeLists
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.services import get_model_version
+from recipes.validators import is_digits
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def render(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status,
+        content_type='application/json')
+
+
+async def authenticate(request):
+    """Пользователь по токену; без заголовка - аноним без обращения к базе."""
+    if not get_authorization_header(request):
+        return AnonymousUser()
+    result = await sync_to_async(
+        CachedTokenAuthentication().authenticate)(request)
+    return AnonymousUser() if result is None else result[0]
+
+
+def async_api_view(fallback):
+    """
+    Асинхронное чтение с аутентификацией и ошибками в формате DRF.
+    Остальные методы обрабатывает синхронный вьюсет fallback.
+    """
+    fallback = sync_to_async(fallback)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await fallback(request, *args, **kwargs)
+            request = Request(request)
+            try:
+                request.user = await authenticate(request)
+                result = await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                response = exception_handler(exc, {})
+                result = render(response.data, response.status_code)
+                if isinstance(exc, exceptions.AuthenticationFailed):
+                    result['WWW-Authenticate'] = 'Token'
+            if isinstance(result, HttpResponse):
+                return result
+            return render(result)
+        # csrf_exempt в Django 4.2 не поддерживает корутины.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def cached(request, model, load, params=()):
+    """
+    Ответ справочника из общего с CachedReadOnlyMixin кеша;
+    params - cache_query_params соответствующего вьюсета.
+    Обращения к кешу асинхронные: у общего кеша (Redis) это сетевые
+    запросы, и синхронный вызов остановил бы цикл событий.
+    """
+    version, last_modified = await sync_to_async(get_model_version)(model)
+    key = response_key(request, model, version, params)
+    entry = await cache.aget(key)
+    if entry is None:
+        entry = make_entry(await load())
+        await cache.aset(key, entry, timeout=settings.API_CACHE_TIMEOUT)
+    return entry_response(request, entry, last_modified)
+
+
+async def get_object(queryset, pk):
+    instance = await queryset.filter(pk=pk).afirst()
+    if instance is None:
+        raise exceptions.NotFound()
+    return instance
+
+
+@async_api_view(TagViewSet.as_view({'get': 'list'}))
+async def tag_list(request):
+    async def load():
+        return TagSerializer(
+            [tag async for tag in Tag.objects.all()], many=True).data
+    return await cached(request, Tag, load, TagViewSet.cache_query_params)
+
+
+@async_api_view(TagViewSet.as_view({'get': 'retrieve'}))
+async def tag_detail(request, pk):
+    async def load():
+        return TagSerializer(await get_object(Tag.objects.all(), pk)).data
+    return await cached(request, Tag, load, TagViewSet.cache_query_params)
+
+
+@async_api_view(IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(request):
+    name = request.query_params.get('name')
+    if name is not None:
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not is_digits(limit):
+                return render(
+                    {'errors': 'limit должен быть целым числом'}, 400)
+            limit = int(limit)
+        fuzzy = request.query_params.get('fuzzy') in ('1', 'true')
+        return await sync_to_async(ingredient_index.search)(
+            name, limit, fuzzy)
+
+    async def load():
+        return IngredientSerializer(
+            [item async for item in Ingredient.objects.all()],
+            many=True).data
+    return await cached(
+        request, Ingredient, load, IngredientViewSet.cache_query_params)
+
+
+@async_api_view(IngredientViewSet.as_view({'get': 'retrieve'}))
+async def ingredient_detail(request, pk):
+    async def load():
+        return IngredientSerializer(
+            await get_object(Ingredient.objects.all(), pk)).data
+    return await cached(
+        request, Ingredient, load, IngredientViewSet.cache_query_params)
+
+
+async def load_recipe_lists(request):
+    """Списки пользователя для сериализатора: при промахе кеша - база."""
+    return await sync_to_async(UserRecipeLists(request.user).load)()
+
+
+def filter_recipes(request):
+    """Фильтрация как в DjangoFilterBackend; проверка тегов идёт в базу."""
+    filterset = RecipeFilter(
+        request.query_params,
+        Recipe.objects.with_user_state(request.user),
+        request=request,
+    )
+    if not filterset.is_valid():
+        raise exceptions.ValidationError(filterset.errors)
+    return filterset.qs
+
+
+@async_api_view(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    queryset = await sync_to_async(filter_recipes)(request)
+    paginator = AsyncRecipePagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    serializer = RecipeSerializer(page, many=True, context={
+        'request': request, 'image_rendition': 'card',
+        'recipe_lists': await load_recipe_lists(request)})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@async_api_view(RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+async def recipe_detail(request, pk):
+    recipe = await get_object(
+        Recipe.objects.with_user_state(request.user), pk)
+    return RecipeSerializer(recipe, context={
+        'request': request, 'image_rendition': 'full',
+        'recipe_lists': await load_recipe_lists(request)}).data
+
+
+urlpatterns = [
+    path('tags/', tag_list),
+    path('tags/<int:pk>/', tag_detail),
+    path('ingredients/', ingredient_list),
+    path('ingredients/<int:pk>/', ingredient_detail),
+    path('recipes/', recipe_list),
+    path('recipes/<int:pk>/', recipe_detail),
+]
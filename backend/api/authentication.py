@@ -0,0 +1,148 @@
+"""
+Аутентификация по токену с кешированием.
+
+Стандартный TokenAuthentication на каждый запрос выполняет выборку
+Token + User. Здесь результат хранится в LRU-кеше процесса с временем
+жизни, а при AUTH_TOKEN_CACHE_SHARED - ещё и в общем кеше Django,
+чтобы новый процесс не ходил в базу за уже известными токенами.
+В общий кеш попадают только значения полей пользователя и токена без
+хеша пароля; пароль подгружается из базы при первом обращении.
+Записи сбрасывают сигналы удаления токена (выход через djoser)
+и изменения пользователя. Другие процессы видят сброс не позднее
+чем через AUTH_TOKEN_CACHE_TTL секунд.
+"""
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+SHARED_KEY = 'auth:token:{key}'
+SECRET_FIELDS = ('password',)
+
+
+def dump_fields(instance):
+    """Значения полей объекта, кроме секретных."""
+    return {field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields
+            if field.name not in SECRET_FIELDS}
+
+
+def load_fields(model, values):
+    """Объект из значений полей; недостающие поля отложены."""
+    return model.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+
+def dump_credentials(credentials):
+    user, token = credentials
+    return dump_fields(user), dump_fields(token)
+
+
+def load_credentials(data):
+    user = load_fields(User, data[0])
+    token = load_fields(Token, data[1])
+    token.user = user
+    return user, token
+
+
+class TokenCache:
+    """LRU-кеш пар (пользователь, токен) по ключу токена."""
+
+    def __init__(self, size, ttl, shared=False):
+        self.size = size
+        self.ttl = ttl
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        value = None
+        if self.shared:
+            data = cache.get(SHARED_KEY.format(key=key))
+            if data is not None:
+                value = load_credentials(data)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                self._entries.pop(key, None)
+            else:
+                self.hits += 1
+                self._store(key, value, now)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value, time.monotonic())
+        if self.shared:
+            cache.set(SHARED_KEY.format(key=key), dump_credentials(value),
+                      timeout=self.ttl)
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.shared:
+            cache.delete_many([SHARED_KEY.format(key=key) for key in keys])
+
+    def delete_user(self, user_id, keys=()):
+        """Сброс всех записей пользователя и переданных ключей токенов."""
+        with self._lock:
+            keys = {*keys, *(
+                key for key, (_, (user, _)) in self._entries.items()
+                if user.pk == user_id
+            )}
+        self.delete(*keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+            }
+
+
+token_cache = TokenCache(
+    size=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl=settings.AUTH_TOKEN_CACHE_TTL,
+    shared=settings.AUTH_TOKEN_CACHE_SHARED,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который обращается к базе только при промахе."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        return copy(user), token
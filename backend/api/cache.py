@@ -0,0 +1,81 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from recipes.services import get_model_version
+
+RESPONSE_KEY = 'api:response:{model}:{version}:{path}'
+
+
+def response_key(request, model, version, params=()):
+    """
+    Ключ ответа: путь и только учитываемые вьюсетом параметры запроса
+    в порядке их имён. Посторонние параметры не плодят записи кеша.
+    """
+    query = urlencode([(name, value) for name in sorted(params)
+                       for value in request.GET.getlist(name)])
+    return RESPONSE_KEY.format(
+        model=model._meta.label_lower,
+        version=version,
+        path=md5(f'{request.path}?{query}'.encode()).hexdigest(),
+    )
+
+
+def make_entry(data):
+    """Готовый JSON и его ETag для хранения в кеше."""
+    content = JSONRenderer().render(data)
+    return content, f'"{md5(content).hexdigest()}"'
+
+
+def entry_response(request, entry, last_modified):
+    """Ответ из записи кеша или 304 на условный запрос."""
+    content, etag = entry
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class CachedReadOnlyMixin:
+    """
+    Кеширование ответов list и retrieve справочных вьюсетов.
+    В кеше хранится готовый JSON; ключ зависит от версии модели,
+    которую меняют сигналы сохранения и удаления. Ответы содержат
+    ETag и Last-Modified, условные запросы получают 304. Другие
+    форматы (браузерный API) рендерит DRF без кеша. Параметры запроса,
+    от которых зависит ответ, перечисляются в cache_query_params.
+    """
+
+    cache_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return handler(request, *args, **kwargs)
+        model = self.get_queryset().model
+        version, last_modified = get_model_version(model)
+        key = response_key(
+            request, model, version, self.cache_query_params)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = make_entry(response.data)
+            cache.set(key, entry, timeout=settings.API_CACHE_TIMEOUT)
+        return entry_response(request, entry, last_modified)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import DatabaseError, connections
+
+PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def connection_settings_messages(alias, config, pooler=False, asgi=False):
+    """Замечания к настройкам подключения одной базы."""
+    messages = []
+    postgres = 'postgresql' in config['ENGINE']
+    max_age = config.get('CONN_MAX_AGE', 0)
+    if asgi and max_age != 0:
+        messages.append(Warning(
+            f'База {alias}: постоянные подключения при ASGI накапливаются '
+            'в потоках отдельных запросов.',
+            hint='Задайте DB_CONN_MAX_AGE=0 и используйте DB_POOLER.',
+            id='api.W003',
+        ))
+    elif postgres and max_age == 0 and not asgi:
+        messages.append(Warning(
+            f'База {alias}: CONN_MAX_AGE = 0, каждый запрос открывает '
+            'новое подключение.',
+            hint='Задайте DB_CONN_MAX_AGE, например 60.',
+            id='api.W001',
+        ))
+    if max_age != 0 and not config.get('CONN_HEALTH_CHECKS'):
+        messages.append(Warning(
+            f'База {alias}: постоянные подключения без проверки '
+            'работоспособности, оборванное подключение вернёт ошибку '
+            'первому запросу.',
+            hint='Включите DB_CONN_HEALTH_CHECKS.',
+            id='api.W002',
+        ))
+    if pooler and postgres and not config.get('DISABLE_SERVER_SIDE_CURSORS'):
+        messages.append(Error(
+            f'База {alias}: при работе через пулер серверные курсоры '
+            'должны быть отключены.',
+            hint='Задайте DISABLE_SERVER_SIDE_CURSORS = True.',
+            id='api.E001',
+        ))
+    return messages
+
+
+def cache_settings_messages(caches, workers):
+    """Замечания к настройкам кеша при нескольких воркерах."""
+    if workers > 1 and caches['default']['BACKEND'] in PROCESS_CACHES:
+        return [Error(
+            f'Кеш default хранится в памяти процесса, а воркеров {workers}: '
+            'сброс кешей справочников, списков покупок и избранного '
+            'не дойдёт до остальных воркеров.',
+            hint='Задайте общий кеш: CACHE_BACKEND='
+                 'django.core.cache.backends.redis.RedisCache и '
+                 'CACHE_LOCATION=redis://redis:6379.',
+            id='api.E003',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_cache_settings(app_configs=None, **kwargs):
+    return cache_settings_messages(settings.CACHES, settings.WEB_CONCURRENCY)
+
+
+@register(Tags.database)
+def check_database_settings(app_configs=None, databases=None, **kwargs):
+    """
+    Проверка настроек и доступности баз при старте:
+    manage.py check --database default, migrate.
+    """
+    messages = []
+    for alias in databases or ():
+        connection = connections[alias]
+        messages += connection_settings_messages(
+            alias, connection.settings_dict,
+            settings.DB_POOLER, settings.ASYNC_VIEWS)
+        try:
+            connection.ensure_connection()
+        except DatabaseError as error:
+            messages.append(Error(
+                f'База {alias} недоступна: {error}', id='api.E002'))
+    return messages
@@ -0,0 +1,92 @@
+import base64
+import binascii
+from hashlib import sha256
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from recipes.images import rendition_name
+
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """
+    Изображение в формате data URI.
+    Base64 декодируется частями во временный файл на диске, имя файла -
+    хеш содержимого. Если файл с таким именем уже есть в хранилище,
+    вместо загрузки возвращается его путь: одинаковые изображения
+    хранятся один раз, и их копии не строятся заново.
+    Ссылка http означает, что изображение не менялось.
+    Сама строка base64 приходит в теле JSON и целиком лежит в памяти
+    после разбора запроса (её размер ограничивает client_max_body_size
+    в nginx); на диск уходят только декодированные байты.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            file = super().to_internal_value(self.decode(data))
+            name = self.stored_name(file)
+            if name is None:
+                return file
+            file.close()
+            return name
+        if isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        return super().to_internal_value(data)
+
+    def stored_name(self, file):
+        """Путь файла с тем же содержимым в хранилище модели или None."""
+        field = self.parent.Meta.model._meta.get_field(self.source)
+        name = field.generate_filename(None, file.name)
+        if field.storage.exists(name):
+            return name
+        return None
+
+    def decode(self, data):
+        header, _, payload = data.partition(';base64,')
+        content_type = header[len('data:'):]
+        extension = content_type.split('/')[-1]
+        file = TemporaryUploadedFile(
+            'upload', content_type, size=0, charset=None)
+        digest = sha256()
+        try:
+            for start in range(0, len(payload), DECODE_CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    payload[start:start + DECODE_CHUNK_SIZE])
+                digest.update(chunk)
+                file.write(chunk)
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_image')
+        file.size = file.tell()
+        file.seek(0)
+        file.name = f'{digest.hexdigest()}.{extension}'
+        return file
+
+
+class RenditionImageField(StreamingBase64ImageField):
+    """
+    Изображение рецепта со ссылкой на подходящую уменьшенную копию.
+    Размер копии задаётся аргументом rendition или ключом
+    image_rendition в контексте сериализатора.
+    """
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        rendition = self.rendition or self.context.get(
+            'image_rendition', 'full')
+        name = rendition_name(value.instance, rendition)
+        if name is None:
+            return super().to_representation(value)
+        url = value.storage.url(name)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -1,7 +1,11 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from recipes.search import search_recipes
+from recipes.validators import is_digits
 
 
 class IngredientFilter(SearchFilter):
@@ -17,20 +21,24 @@ class RecipeFilter(FilterSet):
     """
     Фильтр рецептов по автору, тегу,
     наличию в избранном и в списке покупок.
+    Каждый фильтр сужает переданный queryset условием по ключу или
+    подзапросом EXISTS: фильтры сочетаются, строки не размножаются,
+    а построение фильтра не обращается к базе.
     """
-    author = filters.AllValuesMultipleFilter(
-        field_name='author__id',
-    )
-    is_favorited = filters.BooleanFilter(method='get_is_favorited')
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
+    search = filters.CharFilter(method='filter_search')
+    author = filters.CharFilter(method='filter_author')
+    tags = filters.CharFilter(method='filter_tags')
+    is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
-        method='get_is_in_shopping_cart',
+        method='filter_is_in_shopping_cart',
         label='shopping_cart',
     )
+    ordering = filters.OrderingFilter(
+        fields=(
+            ('pub_date', 'pub_date'),
+            ('favorites_count', 'popular'),
+        ),
+    )
 
     class Meta:
         model = Recipe
@@ -42,17 +50,39 @@ class RecipeFilter(FilterSet):
             'is_in_shopping_cart',
         )
 
-    def get_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorites__user=self.request.user)
-        return queryset
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию и тексту, упорядоченный по релевантности."""
+        return search_recipes(queryset, value)
+
+    def filter_author(self, queryset, name, value):
+        """Рецепты любого из авторов: ?author=1&author=2."""
+        authors = [author for author in self.data.getlist(name) if author]
+        if not all(is_digits(author) for author in authors):
+            raise ValidationError({name: 'Ожидаются id авторов.'})
+        return queryset.filter(author_id__in=authors)
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов: ?tags=breakfast&tags=lunch."""
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag__slug__in=[slug for slug in self.data.getlist(name) if slug],
+        )))
+
+    def filter_relation(self, queryset, model, value):
+        if not value:
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(Exists(model.objects.filter(
+            user=user, recipe=OuterRef('pk'))))
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_relation(queryset, Favorite, value)
 
-    def get_is_in_shopping_cart(self, queryset, name, value):
+    def filter_is_in_shopping_cart(self, queryset, name, value):
         """Рецепты, находящиеся в списке покупок."""
-        if value:
-            return Recipe.objects.filter(
-                recipe_shopping_cart__user=self.request.user
-            )
+        return self.filter_relation(queryset, ShoppingCart, value)
 
 
 class SearchingFilter(SearchFilter):
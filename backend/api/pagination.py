@@ -1,5 +1,126 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipePagination(LimitPagination):
+    """
+    Пагинация рецептов.
+    По умолчанию - номера страниц (page, limit). С параметром cursor -
+    выборка по ключу (pub_date, id) без COUNT и OFFSET; первая страница
+    запрашивается с пустым cursor, следующие - по ссылке next.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = self.keyset_queryset(queryset, request, page_size)
+        return self.keyset_page(list(queryset), page_size)
+
+    def keyset_queryset(self, queryset, request, page_size):
+        """Выборка страницы после позиции курсора с одной лишней записью."""
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk))
+        return queryset[:page_size + 1]
+
+    def paginate_positions(self, load, request):
+        """
+        Страница по курсору для выборок, которые не сводятся к одному
+        queryset (лента подписок): load(position, limit) возвращает
+        не более limit записей после позиции.
+        """
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param))
+        return self.keyset_page(load(position, page_size + 1), page_size)
+
+    def keyset_page(self, page, page_size):
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = (page[-1].pub_date, page[-1].id)
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(*self.next_position))
+
+    def encode_cursor(self, pub_date, pk):
+        position = f'{pub_date.isoformat()}|{pk}'
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class AsyncRecipePagination(RecipePagination):
+    """Пагинация рецептов для асинхронных представлений."""
+
+    async def apaginate_queryset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.keyset = self.cursor_query_param in request.query_params
+        if self.keyset:
+            queryset = self.keyset_queryset(queryset, request, page_size)
+            return self.keyset_page(
+                [item async for item in queryset], page_size)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        number = self.get_page_number(request, paginator)
+        if number in self.last_page_strings:
+            number = paginator.num_pages
+        try:
+            number = paginator.validate_number(number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=number, message=str(exc)))
+        bottom = (number - 1) * page_size
+        page = [item async for item in queryset[bottom:bottom + page_size]]
+        self.page = Page(page, number, paginator)
+        return page
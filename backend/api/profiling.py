@@ -0,0 +1,261 @@
+"""
+Профилирование запросов к API.
+
+ProfilingMiddleware для каждого представления (ViewSet.action) копит
+число запросов к базе и их время (через connection.execute_wrapper),
+время сериализации - сериализаторов с ProfiledSerializerMixin и
+рендеринга ответа - и полное время ответа. Показатели хранятся в
+памяти процесса и отдаются в текстовом формате Prometheus на
+/api/metrics/ только администраторам; метка pid различает воркеры.
+Если представление выполнило больше запросов, чем позволяет
+QUERY_BUDGET (или QUERY_BUDGETS для отдельного представления),
+в лог api.profiling пишется предупреждение.
+Тело потокового ответа (выгрузка списка покупок) формируется уже после
+выхода из middleware, поэтому его запросы считаются при чтении потока,
+а показатели записываются, когда поток прочитан или закрыт.
+Асинхронные потоки так не учитываются.
+"""
+import logging
+import os
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+from api.authentication import token_cache
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Показатели одного запроса; вызывается как execute_wrapper."""
+
+    __slots__ = ('queries', 'db_time', 'serialize_time',
+                 'serialize_queries', 'depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_queries = 0
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+
+    def add_serialization(self, started, queries):
+        self.serialize_time += perf_counter() - started
+        self.serialize_queries += self.queries - queries
+
+
+class ProfiledSerializerMixin:
+    """
+    Учёт времени и запросов сериализации в профиле текущего запроса.
+    Вложенные сериализаторы входят во время внешнего.
+    """
+
+    def to_representation(self, instance):
+        profile = _current.get()
+        if profile is None or profile.depth:
+            return super().to_representation(instance)
+        profile.depth += 1
+        started, queries = perf_counter(), profile.queries
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.depth -= 1
+            profile.add_serialization(started, queries)
+
+
+class ProfiledModelSerializer(ProfiledSerializerMixin,
+                              serializers.ModelSerializer):
+    """Базовый сериализатор моделей API."""
+
+
+class ViewStats:
+    __slots__ = ('requests', 'errors', 'buckets', 'duration', 'queries',
+                 'db_time', 'serialize_time', 'serialize_queries',
+                 'over_budget')
+
+    def __init__(self):
+        self.requests = self.errors = self.over_budget = 0
+        self.queries = self.serialize_queries = 0
+        self.duration = self.db_time = self.serialize_time = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+class Metrics:
+    """Накопленные показатели представлений процесса."""
+
+    COUNTERS = (
+        ('requests', 'foodgram_requests_total',
+         'Количество ответов'),
+        ('errors', 'foodgram_request_errors_total',
+         'Количество ответов с кодом 5xx'),
+        ('queries', 'foodgram_db_queries_total',
+         'Количество запросов к базе'),
+        ('db_time', 'foodgram_db_duration_seconds_total',
+         'Время запросов к базе'),
+        ('serialize_time', 'foodgram_serialization_duration_seconds_total',
+         'Время сериализации и рендеринга ответа'),
+        ('serialize_queries', 'foodgram_serialization_queries_total',
+         'Запросы к базе во время сериализации'),
+        ('over_budget', 'foodgram_query_budget_exceeded_total',
+         'Ответы с превышением бюджета запросов к базе'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, profile, duration, status_code, over_budget):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            stats.requests += 1
+            stats.errors += status_code >= 500
+            stats.over_budget += over_budget
+            stats.duration += duration
+            stats.queries += profile.queries
+            stats.db_time += profile.db_time
+            stats.serialize_time += profile.serialize_time
+            stats.serialize_queries += profile.serialize_queries
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[index] += 1
+
+    def get(self, view):
+        with self._lock:
+            return self._views.get(view)
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Показатели в текстовом формате Prometheus."""
+        pid = os.getpid()
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            for attr, name, help_text in self.COUNTERS:
+                lines += [f'# HELP {name} {help_text}.',
+                          f'# TYPE {name} counter']
+                lines += [
+                    f'{name}{{view="{escape(view)}",pid="{pid}"}} '
+                    f'{getattr(stats, attr)}'
+                    for view, stats in views]
+            name = 'foodgram_request_duration_seconds'
+            lines += [f'# HELP {name} Время ответа.',
+                      f'# TYPE {name} histogram']
+            for view, stats in views:
+                labels = f'view="{escape(view)}",pid="{pid}"'
+                lines += [
+                    f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                    for bound, count in zip(DURATION_BUCKETS, stats.buckets)]
+                lines += [
+                    f'{name}_bucket{{{labels},le="+Inf"}} {stats.requests}',
+                    f'{name}_sum{{{labels}}} {stats.duration}',
+                    f'{name}_count{{{labels}}} {stats.requests}',
+                ]
+        cache_stats = token_cache.stats()
+        for key, kind in (('hits', 'counter'), ('misses', 'counter'),
+                          ('size', 'gauge')):
+            name = f'foodgram_auth_token_cache_{key}'
+            if kind == 'counter':
+                name += '_total'
+            lines += [f'# TYPE {name} {kind}',
+                      f'{name}{{pid="{pid}"}} {cache_stats[key]}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def view_name(view_func, method):
+    """ViewSet.action для вьюсетов DRF, иначе путь к функции."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+class ProfilingMiddleware:
+    """Сбор показателей запроса; ставится первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = perf_counter()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        view = getattr(request, 'profile_view', None)
+        if view is None:
+            return response
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.profile_stream(
+                response.streaming_content, profile,
+                lambda: self.observe(
+                    request, view, profile, started, response))
+        else:
+            self.observe(request, view, profile, started, response)
+        return response
+
+    def profile_stream(self, content, profile, finish):
+        """Учёт запросов при чтении потокового ответа."""
+        iterator = iter(content)
+        try:
+            while True:
+                with connection.execute_wrapper(profile):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            finish()
+
+    def observe(self, request, view, profile, started, response):
+        budget = settings.QUERY_BUDGETS.get(view, settings.QUERY_BUDGET)
+        over_budget = profile.queries > budget
+        if over_budget:
+            logger.warning(
+                '%s %s: %d запросов к базе при бюджете %d',
+                view, request.path, profile.queries, budget)
+        metrics.observe(view, profile, perf_counter() - started,
+                        response.status_code, over_budget)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile_view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        """Время рендеринга ответа DRF входит во время сериализации."""
+        profile = _current.get()
+        started, queries = perf_counter(), profile.queries
+        response.add_post_render_callback(
+            lambda response: profile.add_serialization(started, queries))
+        return response
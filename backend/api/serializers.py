@@ -1,18 +1,28 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from django.shortcuts import get_object_or_404
-from drf_base64.fields import Base64ImageField
 
+from api.fields import RenditionImageField
+from api.profiling import ProfiledModelSerializer
 from users.models import Subscription, User
+from recipes.membership import UserRecipeLists
 from recipes.models import (
+    Favorite,
     IngredientAmount,
     Recipe,
     Ingredient,
+    ShoppingCart,
     Tag,
 )
-from recipes.validators import validate_ingredients, validate_tags
+from recipes.services import bump_recipe_carts
+from recipes.validators import (
+    is_digits,
+    validate_ingredients,
+    validate_tags,
+)
 
 
-class NewUserSerializer(serializers.ModelSerializer):
+class NewUserSerializer(ProfiledModelSerializer):
     """Сериализатор для User."""
 
     password = serializers.CharField(write_only=True)
@@ -28,7 +38,11 @@ class NewUserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Статус подписки на автора."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
+        if not user.is_authenticated:
+            return False
         return obj.following.filter(user=user.id).exists()
 
     def create(self, validated_data):
@@ -44,14 +58,14 @@ class NewUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(ProfiledModelSerializer):
     email = serializers.ReadOnlyField(source='author.email')
     id = serializers.ReadOnlyField(source='author.id')
     username = serializers.ReadOnlyField(source='author.username')
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='author.recipes.count')
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -64,19 +78,27 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         """Статус подписки на автора."""
         user = self.context.get('request').user
+        if obj.user_id == user.id:
+            return True
         return user.follower.filter(author=obj.author).exists()
 
     def get_recipes(self, obj):
-        """Получение списка рецептов автора."""
-        limit = self.context.get('request').GET.get('recipes_limit')
-        recipe_obj = obj.author.recipes.all()
-        if limit:
-            recipe_obj = recipe_obj[:int(limit)]
+        """
+        Получение списка рецептов автора.
+        Использует рецепты, заранее загруженные для всей страницы.
+        """
+        if hasattr(obj.author, 'latest_recipes'):
+            recipe_obj = obj.author.latest_recipes
+        else:
+            recipe_obj = obj.author.recipes.all()
+            limit = self.context.get('request').GET.get('recipes_limit')
+            if limit and is_digits(limit):
+                recipe_obj = recipe_obj[:int(limit)]
         serializer = SmallRecipeSerializer(recipe_obj, many=True)
         return serializer.data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ProfiledModelSerializer):
     class Meta:
         model = Tag
         fields = (
@@ -84,7 +106,7 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ProfiledModelSerializer):
     class Meta:
         model = Ingredient
         fields = (
@@ -92,7 +114,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientAmountSerializer(serializers.ModelSerializer):
+class IngredientAmountSerializer(ProfiledModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -105,8 +127,8 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         )
 
 
-class SmallRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+class SmallRecipeSerializer(ProfiledModelSerializer):
+    image = RenditionImageField(rendition='thumb')
 
     class Meta:
         model = Recipe
@@ -114,12 +136,25 @@ class SmallRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BULK_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class RecipeSerializer(ProfiledModelSerializer):
     author = NewUserSerializer(read_only=True)
     tags = TagSerializer(read_only=True, many=True)
     ingredients = IngredientAmountSerializer(
         read_only=True, many=True, source='ingredientamount_set')
-    image = Base64ImageField()
+    image = RenditionImageField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -130,73 +165,126 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
         )
 
+    def in_user_list(self, model, obj):
+        """
+        Проверка по спискам пользователя из контекста; они загружаются
+        один раз на все рецепты, которые выводит сериализатор.
+        """
+        recipe_lists = self.context.get('recipe_lists')
+        if recipe_lists is None:
+            recipe_lists = self.context['recipe_lists'] = UserRecipeLists(
+                self.context.get('request').user)
+        return recipe_lists.contains(model, obj.id)
+
     def get_is_favorited(self, obj):
         """Рецепт в избранном или нет. """
-        user = self.context.get('request').user
-        if user.is_authenticated:
-            return user.favorites.filter(recipe=obj).exists()
-        return False
+        return self.in_user_list(Favorite, obj)
 
     def get_is_in_shopping_cart(self, obj):
         """Рецепт в списке покупок."""
-        user = self.context.get('request').user
-        if user.is_authenticated:
-            return user.user_shopping_cart.filter(recipe=obj).exists()
-        return False
+        return self.in_user_list(ShoppingCart, obj)
 
-    def get_author(self, obj):
-        """Рецепт в списке покупок."""
-        user = self.context.get('request').user
-        return user.recipe.all()
+    def to_representation(self, instance):
+        """Передача аннотированного статуса подписки в автора рецепта."""
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     def create_ingredient_amount(self, valid_ingredients, recipe):
         """Создание уникальных записей: ингредиент - рецепт - количество."""
-        ingredient_amounts = []
-
-        for ingredient_data in valid_ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_data.get('id'))
-            ingredient_amount = IngredientAmount(
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
                 recipe=recipe,
-                ingredient=ingredient,
-                amount=ingredient_data.get('amount'))
-            ingredient_amounts.append(ingredient_amount)
-
-        IngredientAmount.objects.bulk_create(ingredient_amounts)
-
-    def create_tags(self, data, recipe):
-        """Создание тэгов у рецепта."""
-        valid_tags = validate_tags(data.get('tags'))
-        tags = Tag.objects.filter(id__in=valid_tags)
-        recipe.tags.set(tags)
+                ingredient=ingredient_data['ingredient'],
+                amount=ingredient_data['amount'])
+            for ingredient_data in valid_ingredients
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         valid_ingredients = validated_data.pop('ingredients')
+        valid_tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        self.create_tags(self.initial_data, recipe)
+        self.close_image(validated_data)
+        recipe.tags.set(valid_tags)
         self.create_ingredient_amount(valid_ingredients, recipe)
         return recipe
 
+    def close_image(self, validated_data):
+        """
+        Закрытие временного файла изображения после сохранения.
+        Уже сохранённое изображение приходит путём, закрывать нечего.
+        """
+        image = validated_data.get('image')
+        if image is not None and not isinstance(image, str):
+            image.close()
+
     def validate(self, data):
-        """Валидация ингридиентов."""
-        ingredients = self.initial_data.get('ingredients')
-        valid_ingredients = validate_ingredients(ingredients)
-        data['ingredients'] = valid_ingredients
+        """Валидация ингридиентов и тэгов."""
+        data['ingredients'] = validate_ingredients(
+            self.initial_data.get('ingredients'))
+        data['tags'] = validate_tags(self.initial_data.get('tags'))
         return data
 
+    def update_tags(self, recipe, tags):
+        """Добавление новых и удаление лишних тэгов рецепта."""
+        current = set(recipe.tags.values_list('id', flat=True))
+        incoming = {tag.id for tag in tags}
+        if current - incoming:
+            recipe.tags.remove(*(current - incoming))
+        if incoming - current:
+            recipe.tags.add(*(incoming - current))
+
+    def update_ingredient_amounts(self, recipe, valid_ingredients):
+        """
+        Изменение только отличающихся записей ингредиент - количество.
+        Возвращает True, если состав рецепта изменился.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in recipe.ingredientamount_set.all()
+        }
+        incoming = {
+            data['ingredient'].id: data for data in valid_ingredients
+        }
+        removed = current.keys() - incoming.keys()
+        created = [
+            IngredientAmount(recipe=recipe, **data)
+            for id, data in incoming.items() if id not in current
+        ]
+        updated = []
+        for id in current.keys() & incoming.keys():
+            if current[id].amount != incoming[id]['amount']:
+                current[id].amount = incoming[id]['amount']
+                updated.append(current[id])
+        if removed:
+            recipe.ingredientamount_set.filter(
+                ingredient_id__in=removed).delete()
+        if updated:
+            IngredientAmount.objects.bulk_update(updated, ('amount',))
+        if created:
+            IngredientAmount.objects.bulk_create(created)
+        return bool(removed or updated or created)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Изменение рецепта."""
-        instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        instance.save()
-        instance.tags.remove()
-        self.create_tags(self.initial_data, instance)
-        instance.ingredientamount_set.filter(recipe__in=[instance.id]).delete()
-        valid_ingredients = validated_data.get(
-            'ingredients', instance.ingredients)
-        self.create_ingredient_amount(valid_ingredients, instance)
+        """
+        Изменение рецепта.
+        Сохраняются только изменившиеся поля, тэги и ингредиенты
+        обновляются по разнице с текущим состоянием.
+        """
+        valid_ingredients = validated_data.pop('ingredients')
+        valid_tags = validated_data.pop('tags')
+        changed_fields = []
+        for field, value in validated_data.items():
+            if getattr(instance, field) != value:
+                setattr(instance, field, value)
+                changed_fields.append(field)
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+        self.close_image(validated_data)
+        self.update_tags(instance, valid_tags)
+        if self.update_ingredient_amounts(instance, valid_ingredients):
+            bump_recipe_carts(instance.id)
         return instance
@@ -0,0 +1,141 @@
+import csv
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from fpdf import FPDF, FPDF_VERSION
+from fpdf.fpdf import SubsetMap
+
+from recipes.services import get_cart_ingredients, get_cart_version
+
+FONT_FAMILY = 'DejaVu'
+FONT_PATH = settings.BASE_DIR / 'recipes' / 'fonts' / 'DejaVuSansCondensed.ttf'
+TITLE = 'Ваш список покупок:'
+CACHE_KEY = 'shopping_cart:file:{user_id}:{version}:{file_type}'
+# Версия fpdf2, с внутренними полями которой (fonts, font_files,
+# SubsetMap) проверен кеш шрифта; на других работает обычный add_font.
+FONT_CACHE_FPDF_VERSION = '2.5.4'
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListPDF(FPDF):
+    """
+    PDF, разбирающий TTF-шрифт один раз на процесс.
+    Результат add_font копируется из внутренних полей fpdf2, поэтому
+    кеш включён только для FONT_CACHE_FPDF_VERSION (она закреплена
+    в req.txt); test_shopping_list сверяет PDF с обычным add_font.
+    """
+
+    _font_lock = threading.Lock()
+    _font = None
+    _font_file = None
+
+    def add_cached_font(self, family, fname):
+        if FPDF_VERSION != FONT_CACHE_FPDF_VERSION:
+            self.add_font(family, '', fname)
+            return
+        fontkey = family.lower()
+        with self._font_lock:
+            if ShoppingListPDF._font is None:
+                self.add_font(family, '', fname)
+                ShoppingListPDF._font = {
+                    key: value for key, value in self.fonts[fontkey].items()
+                    if key not in ('i', 'subset')
+                }
+                ShoppingListPDF._font_file = dict(self.font_files[fontkey])
+                return
+        subset = '\x00 '
+        if self.str_alias_nb_pages:
+            subset += '0123456789' + self.str_alias_nb_pages
+        self.fonts[fontkey] = {
+            **self._font,
+            'i': len(self.fonts) + 1,
+            'subset': SubsetMap(map(ord, subset)),
+        }
+        self.font_files[fontkey] = dict(self._font_file)
+
+
+def iter_rows(ingredients):
+    """Строки списка покупок: номер, название, количество, единица."""
+    for i, ingredient in enumerate(ingredients):
+        yield (
+            i + 1,
+            ingredient['name'],
+            ingredient['amount'],
+            ingredient['measurement_unit'],
+        )
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}\n'
+    for number, name, amount, unit in iter_rows(ingredients):
+        yield f'{number}) {name} - {amount} {unit}\n'
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for _, name, amount, unit in iter_rows(ingredients):
+        yield writer.writerow((name, amount, unit))
+
+
+def render_pdf(ingredients):
+    pdf = ShoppingListPDF()
+    pdf.add_page()
+    pdf.add_cached_font(FONT_FAMILY, FONT_PATH)
+    pdf.set_font(FONT_FAMILY, size=14)
+    pdf.cell(txt=TITLE, center=True)
+    pdf.ln(8)
+    for number, name, amount, unit in iter_rows(ingredients):
+        pdf.cell(40, 10, f'{number}) {name} - {amount} {unit}')
+        pdf.ln()
+    yield bytes(pdf.output(dest='S'))
+
+
+FILE_TYPES = {
+    'pdf': ('application/pdf', render_pdf),
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+}
+
+
+def cache_chunks(chunks, key):
+    """Отдаёт части файла и кеширует файл целиком после последней."""
+    content = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        content.append(chunk)
+        yield chunk
+    cache.set(
+        key, b''.join(content), timeout=settings.SHOPPING_CART_CACHE_TIMEOUT)
+
+
+def shopping_list_response(user, file_type):
+    """
+    Ответ с файлом списка покупок.
+    Готовый файл кешируется до изменения списка покупок пользователя.
+    """
+    content_type, render = FILE_TYPES[file_type]
+    key = CACHE_KEY.format(
+        user_id=user.id,
+        version=get_cart_version(user.id),
+        file_type=file_type,
+    )
+    content = cache.get(key)
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        chunks = cache_chunks(
+            render(get_cart_ingredients(user).iterator()), key)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_cart.{file_type}"')
+    return response
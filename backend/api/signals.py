@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Сброс кеша аутентификации при выходе пользователя."""
+    token_cache.delete(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Сброс кешированного пользователя после изменения или удаления."""
+    keys = ()
+    if token_cache.shared:
+        keys = Token.objects.filter(
+            user_id=instance.pk).values_list('key', flat=True)
+    token_cache.delete_user(instance.pk, keys)
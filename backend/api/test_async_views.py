@@ -0,0 +1,104 @@
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from api.async_views import urlpatterns as async_urlpatterns
+from api.authentication import token_cache
+from foodgram.urls import urlpatterns as sync_urlpatterns
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    Tag,
+)
+from users.models import Subscription, User
+
+urlpatterns = (path('api/', include(async_urlpatterns)), *sync_urlpatterns)
+
+
+class AsyncViewsTestCase(TestCase):
+    """Асинхронные представления отвечают так же, как вьюсеты DRF."""
+    maxDiff = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        author = User.objects.create(username='author', email='a@x.ru')
+        Subscription.objects.create(user=cls.user, author=author)
+        cls.token = Token.objects.create(user=cls.user)
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}')
+            for i in range(2))
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука'))
+        for i in range(8):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=i + 1, image='recipes/test.png',
+                image_renditions={'source': 'recipes/test.png'})
+            recipe.tags.add(tags[i % 2])
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=ingredients[i % 3], amount=i + 1)
+            if i % 3 == 0:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+        cls.recipe = recipe
+
+    def setUp(self):
+        token_cache.clear()
+
+    async def compare(self, url, token=True):
+        headers = {}
+        if token:
+            headers['Authorization'] = f'Token {self.token.key}'
+        expected = await sync_to_async(self.client.get)(url, headers=headers)
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.json(), expected.json(), url)
+        return response
+
+    async def test_catalog(self):
+        for url in ('/api/tags/',
+                    '/api/ingredients/', '/api/ingredients/?name=са',
+                    '/api/ingredients/?name=x&limit=x'):
+            await self.compare(url)
+
+    async def test_catalog_detail(self):
+        tag = await Tag.objects.afirst()
+        ingredient = await Ingredient.objects.afirst()
+        for url in (f'/api/tags/{tag.id}/', '/api/tags/0/',
+                    f'/api/ingredients/{ingredient.id}/'):
+            await self.compare(url)
+
+    async def test_recipe_list(self):
+        for url in ('/api/recipes/', '/api/recipes/?limit=3&page=2',
+                    '/api/recipes/?page=100', '/api/recipes/?tags=tag1',
+                    '/api/recipes/?tags=missing',
+                    '/api/recipes/?is_favorited=1',
+                    '/api/recipes/?cursor=&limit=5',
+                    '/api/recipes/?cursor=broken'):
+            await self.compare(url)
+        response = await self.compare('/api/recipes/?cursor=&limit=5')
+        await self.compare(response.json()['next'])
+
+    async def test_recipe_detail(self):
+        for url in (f'/api/recipes/{self.recipe.id}/', '/api/recipes/0/'):
+            await self.compare(url)
+            await self.compare(url, token=False)
+
+    async def test_invalid_token(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(
+                '/api/recipes/', headers={'Authorization': 'Token invalid'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    async def test_writes_use_viewsets(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.post(
+                '/api/recipes/', {}, content_type='application/json',
+                headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 400)
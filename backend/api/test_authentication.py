@@ -0,0 +1,96 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import SHARED_KEY, TokenCache, token_cache
+from users.models import User
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+    """Кеширование пользователя по токену."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='user', email='user@x.ru', first_name='Имя')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_second_request_skips_token_query(self):
+        with self.assertNumQueries(2):
+            self.get_me()
+        with self.assertNumQueries(1):
+            response = self.get_me()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['id'], self.user.id)
+        self.assertEqual(token_cache.stats(), {
+            'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_user_change_resets_cache(self):
+        self.get_me()
+        self.user.first_name = 'Новое'
+        self.user.save()
+        response = self.get_me()
+        self.assertEqual(response.json()['first_name'], 'Новое')
+        self.assertEqual(token_cache.stats()['misses'], 2)
+
+    def test_logout_resets_cache(self):
+        self.get_me()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(
+            self.get_me().status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_invalid_token_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        for _ in range(2):
+            self.assertEqual(
+                self.get_me().status_code, HTTPStatus.UNAUTHORIZED)
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TokenCacheTestCase(TestCase):
+
+    def test_lru_eviction_and_ttl(self):
+        cache = TokenCache(size=2, ttl=60)
+        for key in 'abc':
+            cache.set(key, key)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+        cache.ttl = -1
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('d'))
+
+    def test_shared_cache_fills_local(self):
+        user = User.objects.create(username='user', email='user@x.ru')
+        user.set_password('secret')
+        user.save()
+        token = Token.objects.create(user=user)
+        first = TokenCache(size=10, ttl=60, shared=True)
+        second = TokenCache(size=10, ttl=60, shared=True)
+        first.set(token.key, (user, token))
+        self.assertNotIn(user.password, str(cache.get(
+            SHARED_KEY.format(key=token.key))))
+        with self.assertNumQueries(0):
+            cached_user, cached_token = second.get(token.key)
+            self.assertEqual(
+                (cached_user.pk, cached_user.username, cached_token.key),
+                (user.pk, 'user', token.key))
+            self.assertIs(cached_token.user, cached_user)
+        with self.assertNumQueries(1):
+            self.assertTrue(cached_user.check_password('secret'))
+        first.delete(token.key)
+        second.clear()
+        self.assertIsNone(second.get(token.key))
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from recipes.autocomplete import fold, ingredient_index, within_one_edit
+from recipes.models import Ingredient
+
+
+class WithinOneEditTestCase(SimpleTestCase):
+
+    def test_edits(self):
+        self.assertTrue(within_one_edit('мука', 'мука'))
+        self.assertTrue(within_one_edit('мука', 'мяка'))
+        self.assertTrue(within_one_edit('мука', 'мукка'))
+        self.assertTrue(within_one_edit('мука', 'мук'))
+        self.assertTrue(within_one_edit('', 'м'))
+        self.assertFalse(within_one_edit('мука', 'мякк'))
+        self.assertFalse(within_one_edit('мука', 'му'))
+        self.assertFalse(within_one_edit('мука', 'кума'))
+
+    def test_fold(self):
+        self.assertEqual(fold(' Ёжевика '), 'ежевика')
+
+
+class IngredientIndexTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('мука', 'мука ржаная', 'молоко', 'ёжевика', 'сахар'))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def names(self, query, **params):
+        return [item['name']
+                for item in ingredient_index.search(query, **params)]
+
+    def test_prefix(self):
+        self.assertEqual(self.names('мук'), ['мука', 'мука ржаная'])
+        self.assertEqual(self.names('МУКА Р'), ['мука ржаная'])
+        self.assertEqual(self.names('мук', limit=1), ['мука'])
+        self.assertEqual(self.names('хлеб'), [])
+
+    def test_yo_folding(self):
+        self.assertEqual(self.names('еж'), ['ёжевика'])
+        self.assertEqual(self.names('Ёж'), ['ёжевика'])
+
+    def test_fuzzy(self):
+        self.assertEqual(self.names('мло'), [])
+        self.assertEqual(self.names('мло', fuzzy=True), ['молоко'])
+        self.assertEqual(self.names('сахр', fuzzy=True), ['сахар'])
+
+    def test_rebuild_on_change(self):
+        self.assertEqual(self.names('со'), [])
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertEqual(self.names('со'), ['соль'])
+
+    def test_endpoint(self):
+        response = self.client.get('/api/ingredients/', {'name': 'МУ'})
+        self.assertEqual(
+            [item['name'] for item in response.json()],
+            ['мука', 'мука ржаная'])
+        self.assertEqual(set(response.json()[0]),
+                         {'id', 'name', 'measurement_unit'})
@@ -0,0 +1,171 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from api.cache import make_entry, response_key
+from api.checks import cache_settings_messages
+from api.shopping_list import CACHE_KEY
+from recipes.models import (
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.services import get_cart_version, get_model_version
+from users.models import User
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+REDIS = 'django.core.cache.backends.redis.RedisCache'
+
+
+class CacheSettingsCheckTestCase(SimpleTestCase):
+
+    def ids(self, backend, workers):
+        return [message.id for message in cache_settings_messages(
+            {'default': {'BACKEND': backend}}, workers)]
+
+    def test_process_cache(self):
+        self.assertEqual(self.ids(LOCMEM, 1), [])
+        self.assertEqual(self.ids(LOCMEM, 4), ['api.E003'])
+
+    def test_shared_cache(self):
+        self.assertEqual(self.ids(REDIS, 4), [])
+
+
+class CatalogCacheTestCase(TestCase):
+    """ETag, 304 и сброс кеша ответов справочников."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='Завтрак', color='#000001',
+                                     slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_resets_cache(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Обед', color='#000002', slug='lunch')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+
+        url = f'/api/ingredients/{self.ingredient.id}/'
+        self.assertEqual(self.client.get(url).json()['name'], 'соль')
+        self.ingredient.name = 'сахар'
+        self.ingredient.save()
+        self.assertEqual(self.client.get(url).json()['name'], 'сахар')
+        self.ingredient.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unused_params_share_entry(self):
+        self.client.get('/api/tags/')
+        with self.assertNumQueries(0):
+            for params in ({'junk': '1'}, {'junk': '2', 'x': 'y'}):
+                self.assertEqual(
+                    self.client.get('/api/tags/', params).status_code, 200)
+
+    def test_key_params_normalised(self):
+        request = self.client.get('/api/tags/').wsgi_request
+        keys = {
+            response_key(
+                self.client.get(path).wsgi_request, Tag, 'v', ('a', 'b'))
+            for path in ('/api/tags/?b=2&a=1', '/api/tags/?a=1&junk=3&b=2')}
+        self.assertEqual(len(keys), 1)
+        self.assertNotEqual(
+            keys.pop(), response_key(request, Tag, 'v', ('a', 'b')))
+
+    def test_response_before_commit_not_reused(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Tag.objects.create(name='Обед', color='#000002', slug='lunch')
+            # параллельный запрос прочитал справочник до фиксации
+            request = self.client.get('/api/tags/').wsgi_request
+            version, _ = get_model_version(Tag)
+            cache.set(response_key(request, Tag, version), make_entry([]))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+
+    def test_browsable_api(self):
+        self.client.get('/api/tags/')
+        response = self.client.get('/api/tags/', {'format': 'api'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertContains(response, 'Завтрак')
+
+
+class ShoppingCartCacheTestCase(TestCase):
+    """Выгрузка списка покупок сбрасывается при изменении списка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        cls.recipes = []
+        for name in ('соль', 'сахар'):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=name, text='Текст', cooking_time=1,
+                image='recipes/test.png',
+                image_renditions={'source': 'recipes/test.png'})
+            IngredientAmount.objects.create(
+                recipe=recipe, amount=5,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit='г'))
+            cls.recipes.append(recipe)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'type': 'txt'})
+        if response.streaming:
+            return b''.join(response.streaming_content).decode()
+        return response.content.decode()
+
+    def test_cart_change_resets_download(self):
+        self.assertNotIn('сахар', self.download())
+        with self.assertNumQueries(0):
+            self.assertNotIn('сахар', self.download())
+        self.client.post(f'/api/recipes/{self.recipes[1].id}/shopping_cart/')
+        self.assertIn('сахар', self.download())
+        amount = self.recipes[1].ingredientamount_set.get()
+        amount.amount = 7
+        amount.save()
+        self.assertIn('7', self.download())
+
+    def test_download_before_commit_not_reused(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(
+                f'/api/recipes/{self.recipes[1].id}/shopping_cart/')
+            # параллельная выгрузка прочитала строки до фиксации и
+            # закешировала файл под уже новой версией
+            cache.set(CACHE_KEY.format(
+                user_id=self.user.id,
+                version=get_cart_version(self.user.id),
+                file_type='txt'), b'stale')
+        for callback in callbacks:
+            callback()
+        self.assertIn('сахар', self.download())
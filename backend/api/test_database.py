@@ -0,0 +1,138 @@
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock, skipIf
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from api.checks import connection_settings_messages
+from recipes.models import Tag
+
+POSTGRES = {'ENGINE': 'django.db.backends.postgresql'}
+
+
+class ConnectionSettingsCheckTestCase(SimpleTestCase):
+
+    def ids(self, config, pooler=False, asgi=False):
+        return [
+            message.id
+            for message in connection_settings_messages(
+                'default', config, pooler, asgi)
+        ]
+
+    def test_persistent_with_health_checks(self):
+        self.assertEqual(self.ids({
+            **POSTGRES, 'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True,
+        }), [])
+
+    def test_new_connection_per_request(self):
+        self.assertEqual(self.ids({**POSTGRES, 'CONN_MAX_AGE': 0}),
+                         ['api.W001'])
+
+    def test_persistent_without_health_checks(self):
+        self.assertEqual(self.ids({**POSTGRES, 'CONN_MAX_AGE': None}),
+                         ['api.W002'])
+
+    def test_asgi_without_persistent_connections(self):
+        config = {**POSTGRES, 'CONN_MAX_AGE': 0}
+        self.assertEqual(self.ids(config, asgi=True), [])
+        config.update(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        self.assertEqual(self.ids(config, asgi=True), ['api.W003'])
+
+    def test_pooler_requires_disabled_server_side_cursors(self):
+        config = {**POSTGRES, 'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}
+        self.assertEqual(self.ids(config, pooler=True), ['api.E001'])
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+        self.assertEqual(self.ids(config, pooler=True), [])
+
+
+class ConnectionReuseTestCase(TransactionTestCase):
+    """
+    Повторное использование подключений между запросами.
+    Работает на отдельном подключении к той же базе PostgreSQL или
+    к временному файлу SQLite: подключение к базе в памяти не закрывается.
+    """
+
+    def setUp(self):
+        self.connection = connection.copy()
+        if connection.vendor == 'sqlite':
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            self.connection.settings_dict['NAME'] = str(
+                Path(directory.name) / 'db.sqlite3')
+        self.addCleanup(self.connection.close)
+
+    def connect(self, max_age, health_checks=True):
+        self.connection.close()
+        self.connection.settings_dict.update(
+            CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+        self.connection.ensure_connection()
+        return self.connection.connection
+
+    def request(self):
+        """Обработчики request_started и request_finished вокруг запроса."""
+        self.connection.close_if_unusable_or_obsolete()
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.connection.close_if_unusable_or_obsolete()
+
+    def test_persistent_connection_is_reused(self):
+        raw = self.connect(max_age=60)
+        for _ in range(3):
+            self.request()
+        self.assertIs(self.connection.connection, raw)
+
+    def test_connection_closed_without_max_age(self):
+        self.connect(max_age=0)
+        self.request()
+        self.assertIsNone(self.connection.connection)
+
+    def test_connection_closed_after_max_age(self):
+        raw = self.connect(max_age=0.01)
+        time.sleep(0.02)
+        self.request()
+        self.request()
+        self.assertIsNot(self.connection.connection, raw)
+
+    @skipIf(connection.vendor == 'sqlite',
+            'SQLite считает любое подключение работоспособным')
+    def test_broken_connection_replaced_by_health_check(self):
+        raw = self.connect(max_age=60)
+        self.request()
+        raw.close()
+        self.request()
+        self.assertIsNot(self.connection.connection, raw)
+
+
+@skipIf(connection.vendor != 'postgresql', 'Серверные курсоры - PostgreSQL')
+class PoolerTestCase(TransactionTestCase):
+    """
+    Выборка iterator() при работе через пулер в режиме transaction
+    pooling. Пулер может отдать следующую транзакцию другому серверному
+    подключению; его заменяет DISCARD ALL между порциями выборки: он
+    закрывает курсоры сервера, как переход на другое подключение.
+    """
+
+    def setUp(self):
+        for slug in ('a', 'b', 'c'):
+            Tag.objects.create(name=slug, color=f'#00000{slug}', slug=slug)
+        self.addCleanup(connection.close)
+
+    def fetch(self, disable_server_side_cursors):
+        self.enterContext(mock.patch.dict(connection.settings_dict, {
+            'DISABLE_SERVER_SIDE_CURSORS': disable_server_side_cursors}))
+        tags = Tag.objects.order_by('slug').values_list(
+            'slug', flat=True).iterator(chunk_size=1)
+        slugs = [next(tags)]
+        with connection.connection.cursor() as server:
+            server.execute('DISCARD ALL')
+        return slugs + list(tags)
+
+    def test_client_side_cursor_survives_switch(self):
+        self.assertEqual(self.fetch(True), ['a', 'b', 'c'])
+
+    def test_server_side_cursor_lost_on_switch(self):
+        # psycopg2 падает и при закрытии пропавшего курсора
+        with self.assertRaisesRegex(Exception, 'cursor .* does not exist'):
+            self.fetch(False)
@@ -0,0 +1,159 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes import feed
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+
+def create_recipe(author, name):
+    return Recipe.objects.create(
+        author=author, name=name, text='Текст', cooking_time=10,
+        image='recipes/test.png',
+        image_renditions={'source': 'recipes/test.png'})
+
+
+class FeedTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author, cls.other, cls.star = (
+            User.objects.create(username=name, email=f'{name}@x.ru')
+            for name in ('reader', 'author', 'other', 'star'))
+        cls.recipes = [
+            create_recipe(author, f'{author.username} {i}')
+            for i in range(3)
+            for author in (cls.author, cls.other, cls.star)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, author, method='post'):
+        response = getattr(self.client, method)(
+            f'/api/users/{author.id}/subscribe/')
+        self.assertIn(response.status_code, (201, 204))
+
+    def get_feed(self, **params):
+        response = self.client.get('/api/recipes/feed/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def names(self, **params):
+        return [item['name'] for item in self.get_feed(**params)['results']]
+
+    def expected(self, *authors):
+        return [recipe.name for recipe in reversed(self.recipes)
+                if recipe.author in authors]
+
+    def test_anonymous(self):
+        response = APIClient().get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_subscribe_backfills_and_unsubscribe_removes(self):
+        self.assertEqual(self.names(), [])
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        self.assertEqual(self.names(), self.expected(self.author, self.other))
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).followers_count, 1)
+        self.subscribe(self.author, 'delete')
+        self.assertEqual(self.names(), self.expected(self.other))
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).followers_count, 0)
+
+    @override_settings(FEED_BACKFILL=2)
+    def test_backfill_limit(self):
+        self.subscribe(self.author)
+        self.assertEqual(self.names(), self.expected(self.author)[:2])
+
+    def test_new_and_deleted_recipes(self):
+        self.subscribe(self.author)
+        recipe = create_recipe(self.author, 'Новый')
+        create_recipe(self.star, 'Чужой')
+        self.assertEqual(self.names()[0], 'Новый')
+        recipe.delete()
+        self.assertEqual(self.names(), self.expected(self.author))
+
+    def test_cursor_pages(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        data = self.get_feed(limit=4)
+        names = [item['name'] for item in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            names += [item['name'] for item in data['results']]
+        self.assertEqual(names, self.expected(self.author, self.other))
+        response = self.client.get('/api/recipes/feed/', {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_popular_authors_read_on_demand(self):
+        self.subscribe(self.author)
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            self.subscribe(self.star)
+            create_recipe(self.star, 'Популярный')
+            self.assertFalse(FeedEntry.objects.filter(
+                user=self.reader, author=self.star).exists())
+            self.assertEqual(
+                self.names(limit=10),
+                ['Популярный', *self.expected(self.author, self.star)])
+
+    def test_popular_author_without_duplicates(self):
+        self.subscribe(self.star)
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            self.assertEqual(self.names(), self.expected(self.star))
+            self.assertEqual(self.names(limit=2), self.expected(self.star)[:2])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_fanout_limit_crossed(self):
+        self.subscribe(self.star)
+        self.assertEqual(FeedEntry.objects.filter(author=self.star).count(), 3)
+        follower = Subscription.objects.create(
+            user=self.other, author=self.star)
+        self.assertFalse(FeedEntry.objects.filter(author=self.star).exists())
+        create_recipe(self.star, 'Популярный')
+        expected = ['Популярный', *self.expected(self.star)]
+        self.assertEqual(self.names(), expected)
+        # рецепт, опубликованный выше порога, раздаётся при возврате к нему
+        follower.delete()
+        self.assertEqual(FeedEntry.objects.filter(author=self.star).count(), 4)
+        self.assertEqual(self.names(), expected)
+
+    def test_orm_subscription(self):
+        subscription = Subscription.objects.create(
+            user=self.reader, author=self.other)
+        self.assertEqual(self.names(), self.expected(self.other))
+        subscription.delete()
+        self.assertEqual(self.names(), [])
+        self.assertEqual(
+            User.objects.get(pk=self.other.pk).followers_count, 0)
+
+    def test_stale_followers_count(self):
+        # подписка, созданная до появления счётчика подписчиков
+        Subscription.objects.bulk_create(
+            [Subscription(user=self.reader, author=self.other)])
+        self.subscribe(self.other, 'delete')
+        self.assertEqual(
+            User.objects.get(pk=self.other.pk).followers_count, 0)
+        self.subscribe(self.other)
+        self.assertEqual(
+            User.objects.get(pk=self.other.pk).followers_count, 1)
+
+    def test_rebuild(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        FeedEntry.objects.all().delete()
+        self.assertEqual(feed.rebuild(), 6)
+        self.assertEqual(self.names(), self.expected(self.author, self.other))
+
+    def test_query_count(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        self.get_feed()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_feed()
+        # лента, популярные авторы, рецепты, теги, ингредиенты
+        self.assertEqual(len(queries), 5)
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.filters import RecipeFilter
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from users.models import User
+
+
+class RecipeFilterTestCase(TestCase):
+    """Фильтры списка рецептов и их планы запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        cls.authors = User.objects.bulk_create(
+            User(username=f'author{i}', email=f'a{i}@x.ru')
+            for i in range(3))
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}')
+            for i in range(3))
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.authors[i % 3], name=f'Рецепт {i}',
+                   text='Текст', cooking_time=1, image='recipes/test.png')
+            for i in range(12))
+        for recipe in cls.recipes:
+            recipe.tags.set(cls.tags[:2])
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[:6])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[::2])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?limit=100&{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(item['id'] for item in response.json()['results'])
+
+    def ids(self, recipes):
+        return sorted(recipe.id for recipe in recipes)
+
+    def test_author(self):
+        first, second, third = self.authors
+        self.assertEqual(
+            self.get_ids(f'author={first.id}&author={second.id}'),
+            self.ids(r for r in self.recipes if r.author_id != third.id))
+        response = self.client.get('/api/recipes/?author=x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_tags_without_duplicates(self):
+        self.assertEqual(
+            self.get_ids('tags=tag0&tags=tag1'), self.ids(self.recipes))
+        self.assertEqual(self.get_ids('tags=tag2'), [])
+
+    def test_filters_compose(self):
+        author = self.authors[0]
+        expected = self.ids(
+            r for r in self.recipes[:6:2] if r.author_id == author.id)
+        self.assertEqual(self.get_ids(
+            f'author={author.id}&tags=tag0&is_favorited=1'
+            '&is_in_shopping_cart=1'), expected)
+
+    def test_false_values_do_not_filter(self):
+        self.assertEqual(
+            self.get_ids('is_favorited=0&is_in_shopping_cart=0'),
+            self.ids(self.recipes))
+
+    def test_anonymous_relations(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get_ids('is_in_shopping_cart=1'), [])
+
+    def test_all_filters_without_duplicates(self):
+        query = (f'author={self.authors[0].id}&tags=tag0&tags=tag1'
+                 '&is_favorited=1&is_in_shopping_cart=1')
+        expected = self.ids(
+            r for r in self.recipes[:6:2]
+            if r.author_id == self.authors[0].id)
+        self.get_ids(query)
+        # счёт, страница и две предвыборки: фильтры не добавляют запросов
+        with self.assertNumQueries(4):
+            self.assertEqual(self.get_ids(query), expected)
+
+    def filtered(self, query):
+        request = SimpleNamespace(user=self.user)
+        return RecipeFilter(
+            QueryDict(query), Recipe.objects.all(), request=request).qs
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_author_plan_uses_index_order(self):
+        plan = self.explain(
+            self.filtered(f'author={self.authors[0].id}')[:6])
+        self.assertIn('recipe_author_pub_date_idx', plan)
+        self.assertNotIn('Sort', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_favorites_plan_uses_index(self):
+        plan = self.explain(self.filtered('is_favorited=1'))
+        self.assertNotIn('Seq Scan on recipes_favorite', plan)
+        self.assertNotIn('SCAN recipes_favorite', plan.replace(
+            'SCAN recipes_favorite USING', ''))
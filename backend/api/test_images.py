@@ -0,0 +1,141 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.fields import StreamingBase64ImageField
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def png(color, size=(600, 400)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def data_uri(content):
+    return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_RENDITIONS_SYNC=True)
+class RenditionsTestCase(TestCase):
+    """Построение уменьшенных копий и их удаление."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, color):
+        return default_storage.save(
+            f'recipes/{color}.png', ContentFile(png(color)))
+
+    def create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='Текст',
+                cooking_time=1, image=image)
+        recipe.refresh_from_db()
+        return recipe
+
+    def paths(self, recipe):
+        return [path for rendition in ('thumb', 'card', 'full')
+                for path in recipe.image_renditions[rendition].values()]
+
+    def test_build(self):
+        recipe = self.create(self.upload('red'))
+        self.assertEqual(recipe.image_renditions['source'],
+                         recipe.image.name)
+        self.assertEqual(len(self.paths(recipe)), 6)
+        with default_storage.open(
+                recipe.image_renditions['thumb']['webp']) as file:
+            self.assertEqual(Image.open(file).size, (160, 107))
+        with default_storage.open(
+                recipe.image_renditions['full']['jpeg']) as file:
+            self.assertEqual(Image.open(file).size, (600, 400))
+
+    def test_replace_and_delete(self):
+        recipe = self.create(self.upload('green'))
+        old = self.paths(recipe)
+        recipe.image = self.upload('blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        recipe.refresh_from_db()
+        new = self.paths(recipe)
+        self.assertFalse(any(map(default_storage.exists, old)))
+        self.assertTrue(all(map(default_storage.exists, new)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertFalse(any(map(default_storage.exists, new)))
+
+    def test_shared_source_kept(self):
+        image = self.upload('yellow')
+        first = self.create(image)
+        second = self.create(image)
+        self.assertEqual(self.paths(first), self.paths(second))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(map(default_storage.exists, self.paths(second))))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_RENDITIONS_SYNC=True)
+class UploadTestCase(TestCase):
+    """Одинаковые загрузки используют один файл и одни копии."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#000001', slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', {
+                'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 1,
+                'tags': [self.tag.id], 'image': image,
+                'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Recipe.objects.get(pk=response.json()['id'])
+
+    def test_same_image_shared(self):
+        image = data_uri(png('purple'))
+        first = self.create(image)
+        second = self.create(image)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_renditions, second.image_renditions)
+        directory, _, name = first.image.name.rpartition('/')
+        stem = name.partition('.')[0]
+        self.assertEqual([file for file in default_storage.listdir(
+            directory)[1] if file.startswith(stem)], [name])
+
+
+class StreamingBase64ImageFieldTestCase(TestCase):
+
+    def test_decode(self):
+        content = png('white', (10, 10))
+        file = StreamingBase64ImageField().decode(data_uri(content))
+        self.assertEqual(file.read(), content)
+        self.assertEqual(file.size, len(content))
+        self.assertTrue(file.name.endswith('.png'))
+        file.close()
@@ -0,0 +1,99 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from recipes.models import Ingredient, Tag
+
+TAGS = [
+    {'name': 'Завтрак', 'color': '#000001', 'slug': 'breakfast'},
+    {'name': 'Обед', 'color': '#000002', 'slug': 'lunch'},
+]
+
+
+class LoaderTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def ingredients(self):
+        return sorted(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+
+
+class LoadModelsTestCase(LoaderTestCase):
+    """Команда loadmodels: JSON и CSV, повторная загрузка, конфликты."""
+
+    def load(self, path):
+        stdout = StringIO()
+        call_command('loadmodels', path=path, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_rerun_adds_nothing(self):
+        path = self.write('tags.json', json.dumps(TAGS))
+        self.assertIn('прочитано 2, добавлено 2', self.load(path))
+        self.assertIn('прочитано 2, добавлено 0', self.load(path))
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_csv_with_and_without_header(self):
+        self.load(self.write(
+            'header.csv', 'name,measurement_unit\nсоль,г\nмолоко,мл\n'))
+        self.load(self.write('plain.csv', 'сахар, г\nсоль,г\n'))
+        self.assertEqual(self.ingredients(), [
+            ('молоко', 'мл'), ('сахар', 'г'), ('соль', 'г')])
+
+    def test_conflicting_rows(self):
+        Tag.objects.create(**TAGS[0])
+        path = self.write('tags.json', json.dumps([
+            # тот же slug, другие поля: запись уже есть
+            {**TAGS[0], 'name': 'Другой', 'color': '#000009'},
+            # новый slug, но занятое уникальное название
+            {'name': 'Завтрак', 'color': '#000003', 'slug': 'morning'},
+            TAGS[1],
+            TAGS[1],
+        ]))
+        self.assertIn('прочитано 4, добавлено 1', self.load(path))
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', 'name')),
+            [('breakfast', 'Завтрак'), ('lunch', 'Обед')])
+
+    def test_invalid_files(self):
+        for name, content in (('empty.json', '[]'),
+                              ('object.json', '{}'),
+                              ('broken.json', '[{"name": '),
+                              ('fields.json', '[{"name": "x"}]')):
+            with self.assertRaises(CommandError, msg=name):
+                self.load(self.write(name, content))
+
+
+class DbCommandTestCase(LoaderTestCase):
+    """Команда db: COPY в PostgreSQL и пакетная вставка в остальных базах."""
+
+    def load(self, path, *args):
+        stdout = StringIO()
+        call_command('db', path, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_rerun_adds_nothing(self):
+        path = self.write('plain.csv', 'соль,г\nсахар, г\nсоль,г\n')
+        self.assertIn('Добавлено ингредиентов: 2 ', self.load(path))
+        self.assertIn('Добавлено ингредиентов: 0 ', self.load(path))
+        self.assertEqual(self.ingredients(), [('сахар', 'г'), ('соль', 'г')])
+
+    def test_header(self):
+        self.load(self.write(
+            'header.csv', 'name,measurement_unit\nсоль,г\n'))
+        self.load(self.write('named.csv', 'Название,Единица\nмолоко,мл\n'),
+                  '--header')
+        self.assertEqual(self.ingredients(), [('молоко', 'мл'), ('соль', 'г')])
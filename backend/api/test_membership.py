@@ -0,0 +1,133 @@
+from array import array
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes import membership
+from recipes.membership import (
+    UserRecipeLists,
+    cache_key,
+    get_memberships,
+    get_versions,
+)
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.services import toggle_recipe_relation
+from users.models import User
+
+
+class MembershipTestCase(TestCase):
+    """Статусы избранного и списка покупок из кеша пользователя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=1, image='recipes/test.png',
+                   image_renditions={'source': 'recipes/test.png'})
+            for i in range(5))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flags(self):
+        """Статусы рецептов в списке и число запросов на кеш списков."""
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/recipes/').json()['results']
+        loads = sum('"kind"' in query['sql'] for query in queries)
+        return {recipe['id']: (recipe['is_favorited'],
+                               recipe['is_in_shopping_cart'])
+                for recipe in results}, loads
+
+    def test_toggles_reset_cache(self):
+        first, second = self.recipes[0].id, self.recipes[1].id
+        flags, loads = self.flags()
+        self.assertEqual(loads, 1)
+        self.assertEqual(set(flags.values()), {(False, False)})
+        self.assertEqual(self.flags()[1], 0)
+
+        self.client.post(f'/api/recipes/{first}/favorite/')
+        self.client.post(f'/api/recipes/{second}/shopping_cart/')
+        flags, loads = self.flags()
+        self.assertEqual(loads, 1)
+        self.assertEqual(flags[first], (True, False))
+        self.assertEqual(flags[second], (False, True))
+
+        self.client.delete(f'/api/recipes/{first}/favorite/')
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'recipes': [first]}, format='json')
+        flags, loads = self.flags()
+        self.assertEqual(loads, 1)
+        self.assertEqual(flags[first], (False, True))
+
+        self.client.delete('/api/recipes/shopping_cart/')
+        flags, loads = self.flags()
+        self.assertEqual(loads, 1)
+        self.assertEqual(set(flags.values()), {(False, False)})
+
+    def test_unchanged_toggle_keeps_cache(self):
+        recipe = self.recipes[4].id
+        self.client.delete(f'/api/recipes/{recipe}/favorite/')
+        self.flags()
+        self.client.delete(f'/api/recipes/{recipe}/favorite/')
+        self.assertEqual(self.flags()[1], 0)
+
+    def test_stale_snapshot_discarded(self):
+        recipe = self.recipes[4]
+        load_memberships = membership.load_memberships
+
+        def load_before_write(user_id, models):
+            # список меняется после чтения из базы, но до записи в кеш
+            loaded = load_memberships(user_id, models)
+            toggle_recipe_relation(Favorite, user_id, recipe.id, add=True)
+            return loaded
+
+        with mock.patch.object(
+                membership, 'load_memberships', load_before_write):
+            self.assertEqual(list(get_memberships(self.user.id)[Favorite]),
+                             [])
+        self.assertEqual(list(get_memberships(self.user.id)[Favorite]),
+                         [recipe.id])
+
+    def test_orm_changes_reset_cache(self):
+        recipe = self.recipes[2]
+        self.flags()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        cart = ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        flags, loads = self.flags()
+        self.assertEqual(loads, 1)
+        self.assertEqual(flags[recipe.id], (True, True))
+        cart.delete()
+        self.assertEqual(self.flags()[0][recipe.id], (True, False))
+
+    def test_partial_cache(self):
+        recipe = self.recipes[3]
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        get_memberships(self.user.id)
+        cache.delete(cache_key(ShoppingCart, self.user.id,
+                               get_versions(self.user.id)[ShoppingCart]))
+        memberships = get_memberships(self.user.id)
+        self.assertEqual(list(memberships[Favorite]), [recipe.id])
+        self.assertEqual(list(memberships[ShoppingCart]), [recipe.id])
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        flags, loads = self.flags()
+        self.assertEqual(loads, 0)
+        self.assertEqual(set(flags.values()), {(False, False)})
+
+    def test_contains(self):
+        lists = UserRecipeLists(self.user)
+        lists.memberships = {Favorite: array('q', range(2, 20000, 2))}
+        self.assertTrue(lists.contains(Favorite, 2))
+        self.assertTrue(lists.contains(Favorite, 19998))
+        self.assertFalse(lists.contains(Favorite, 3))
+        self.assertFalse(lists.contains(Favorite, 20000))
+        self.assertFalse(lists.contains(Favorite, 1))
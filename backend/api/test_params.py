@@ -0,0 +1,56 @@
+from http import HTTPStatus
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from recipes.validators import is_digits, validate_ingredients
+from users.models import User
+
+# isdigit() пропускает эти строки, а int() на первой падает
+NOT_ASCII_DIGITS = ('²', '٣')
+
+
+class IsDigitsTestCase(SimpleTestCase):
+
+    def test_is_digits(self):
+        self.assertTrue(is_digits('10'))
+        self.assertTrue(is_digits(10))
+        for value in ('', '-1', '1.5', 'x', *NOT_ASCII_DIGITS):
+            self.assertFalse(is_digits(value), value)
+
+
+class ValidateIngredientsTestCase(SimpleTestCase):
+
+    def test_not_objects(self):
+        for data in ([1], ['x'], [None], [[1, 2]], 'x', {'id': 1}):
+            with self.assertRaises(ValidationError, msg=data):
+                validate_ingredients(data)
+
+
+class NumericParamsTestCase(TestCase):
+    """Нечисловые id и лимиты дают 400/404, а не 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_params(self):
+        for value in NOT_ASCII_DIGITS:
+            for method, path, params, code in (
+                    ('get', '/api/ingredients/',
+                     {'name': 'м', 'limit': value}, HTTPStatus.BAD_REQUEST),
+                    ('get', '/api/recipes/', {'author': value},
+                     HTTPStatus.BAD_REQUEST),
+                    ('get', '/api/users/subscriptions/',
+                     {'recipes_limit': value}, HTTPStatus.OK),
+                    ('post', f'/api/recipes/{value}/favorite/', None,
+                     HTTPStatus.NOT_FOUND),
+                    ('post', f'/api/users/{value}/subscribe/', None,
+                     HTTPStatus.NOT_FOUND)):
+                response = getattr(self.client, method)(path, params)
+                self.assertEqual(response.status_code, code, (path, value))
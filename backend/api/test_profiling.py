@@ -0,0 +1,95 @@
+from django.db import connection
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.profiling import RequestProfile, metrics
+from recipes.models import Ingredient, IngredientAmount, Recipe, ShoppingCart
+from users.models import User
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'api.profiling.ProfilingMiddleware'})
+class ProfilingTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='user@x.ru')
+        cls.admin = User.objects.create(
+            username='admin', email='admin@x.ru', is_staff=True)
+        for i in range(3):
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10, image='recipes/test.png',
+                image_renditions={'source': 'recipes/test.png'})
+
+    def setUp(self):
+        metrics.clear()
+        self.client = APIClient()
+
+    def test_view_stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/recipes/')
+        stats = metrics.get('RecipeViewSet.list')
+        self.assertEqual(stats.requests, 1)
+        self.assertEqual(stats.queries, len(queries))
+        self.assertEqual(stats.serialize_queries, 0)
+        self.assertGreater(stats.serialize_time, 0)
+        self.assertGreater(stats.db_time, 0)
+        self.assertGreaterEqual(stats.duration, stats.db_time)
+        self.assertEqual(stats.buckets[-1], 1)
+
+    def test_streaming_response(self):
+        recipe = Recipe.objects.first()
+        IngredientAmount.objects.create(
+            recipe=recipe, amount=1, ingredient=Ingredient.objects.create(
+                name='соль', measurement_unit='г'))
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/', {'type': 'txt'})
+            self.assertTrue(response.streaming)
+            self.assertIsNone(metrics.get('RecipeViewSet.download_cart'))
+            content = b''.join(response.streaming_content)
+        self.assertIn('соль', content.decode())
+        stats = metrics.get('RecipeViewSet.download_cart')
+        self.assertEqual(stats.requests, 1)
+        # список покупок читается уже при отдаче файла
+        self.assertEqual(stats.queries, len(queries))
+
+    def test_serializer_queries(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get('/api/users/me/')
+        # статус подписки текущего пользователя - запрос из сериализатора
+        self.assertEqual(
+            metrics.get('CustomUserViewSet.me').serialize_queries, 1)
+
+    @override_settings(QUERY_BUDGETS={'RecipeViewSet.list': 1})
+    def test_query_budget(self):
+        with self.assertLogs('api.profiling', 'WARNING') as logs:
+            self.client.get('/api/recipes/')
+        self.assertIn('RecipeViewSet.list /api/recipes/', logs.output[0])
+        self.assertEqual(metrics.get('RecipeViewSet.list').over_budget, 1)
+        with self.assertNoLogs('api.profiling', 'WARNING'):
+            self.client.get('/api/tags/')
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/recipes/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn(
+            '# TYPE foodgram_request_duration_seconds histogram', text)
+        self.assertRegex(
+            text, r'foodgram_requests_total\{view="RecipeViewSet.list",'
+                  r'pid="\d+"\} 1\n')
+        self.assertIn('foodgram_auth_token_cache_hits_total', text)
+
+    def test_label_escaping(self):
+        metrics.observe('a"b\\c', RequestProfile(), 0.001, 200, False)
+        self.assertIn(r'view="a\"b\\c"', metrics.render())
@@ -0,0 +1,93 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
+from users.models import User
+
+postgres_only = skipUnless(
+    connection.vendor == 'postgresql', 'полнотекстовый поиск PostgreSQL')
+
+
+class RecipeSearchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='a@x.ru')
+        cls.admin = User.objects.create(
+            username='admin', email='admin@x.ru',
+            is_staff=True, is_superuser=True)
+        recipes = (
+            ('Борщ с говядиной', 'Сварить бульон, добавить свёклу.'),
+            ('Салат из свёклы', 'Натереть варёную свёклу.'),
+            ('Блины', 'Смешать муку с молоком и жарить блины.'),
+        )
+        cls.borscht, cls.salad, cls.pancakes = (
+            Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=10,
+                image='recipes/test.png',
+                image_renditions={'source': 'recipes/test.png'})
+            for name, text in recipes)
+        cls.pancakes.tags.add(Tag.objects.create(
+            name='Завтрак', color='#000001', slug='breakfast'))
+
+    def search(self, query):
+        response = APIClient().get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()['results']]
+
+    def test_search_name_and_text(self):
+        self.assertEqual(self.search('блины'), ['Блины'])
+        self.assertEqual(self.search('бульон'), ['Борщ с говядиной'])
+        self.assertEqual(self.search('пицца'), [])
+
+    def test_empty_query(self):
+        self.assertEqual(len(self.search('')), 3)
+
+    def test_admin_search(self):
+        request = APIClient()
+        request.force_login(self.admin)
+        for query, expected in (
+                ('блины', [self.pancakes]),
+                ('Завтрак', [self.pancakes]),
+                ('author', [self.pancakes, self.salad, self.borscht])):
+            response = request.get('/admin/recipes/recipe/', {'q': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                list(response.context['cl'].result_list), expected, query)
+
+    @postgres_only
+    def test_russian_stemming_and_rank(self):
+        self.assertEqual(self.search('свёкла'),
+                         ['Салат из свёклы', 'Борщ с говядиной'])
+        self.assertEqual(self.search('блинами'), ['Блины'])
+
+    @postgres_only
+    def test_vector_updated_on_save(self):
+        self.pancakes.name = 'Оладьи'
+        with self.assertNumQueries(1):
+            self.pancakes.save(update_fields=['name'])
+        self.assertEqual(self.search('оладьи'), ['Оладьи'])
+
+    @postgres_only
+    def test_query_uses_search_vector(self):
+        queryset = search_recipes(Recipe.objects.all(), 'свёкла')
+        self.assertIn('@@', str(queryset.query))
+        self.assertIn('ts_rank', str(queryset.query))
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('recipe_search_vector_idx', queryset.explain())
+
+    @postgres_only
+    @override_settings(RECIPE_SEARCH_TRIGRAM=True)
+    def test_trigram_fallback(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions "
+                           "WHERE name = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest('pg_trgm не установлен')
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        self.assertEqual(self.search('борш'), ['Борщ с говядиной'])
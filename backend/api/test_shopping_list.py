@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from api import shopping_list
+from api.shopping_list import FONT_FAMILY, FONT_PATH, ShoppingListPDF
+
+
+class ShoppingListPDFTestCase(SimpleTestCase):
+    """Кеш шрифта даёт тот же PDF, что и add_font из fpdf2."""
+
+    def render(self, add_font):
+        pdf = ShoppingListPDF()
+        pdf.set_creation_date(datetime(2023, 1, 1, tzinfo=timezone.utc))
+        pdf.add_page()
+        add_font(pdf)
+        pdf.set_font(FONT_FAMILY, size=14)
+        pdf.cell(txt='1) Мука - 500 г')
+        return bytes(pdf.output())
+
+    def test_cached_font_matches_add_font(self):
+        expected = self.render(
+            lambda pdf: pdf.add_font(FONT_FAMILY, '', FONT_PATH))
+        for _ in range(2):
+            self.assertEqual(self.render(
+                lambda pdf: pdf.add_cached_font(FONT_FAMILY, FONT_PATH)),
+                expected)
+
+    def test_cached_version_is_pinned(self):
+        requirements = settings.BASE_DIR / 'req.txt'
+        self.assertIn(
+            f'fpdf2=={shopping_list.FONT_CACHE_FPDF_VERSION}\n',
+            requirements.read_text())
@@ -0,0 +1,240 @@
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from threading import Barrier
+from unittest import skipIf
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+THREADS = 8
+
+
+@skipIf(connection.vendor == 'sqlite',
+        'тестовая база SQLite в памяти блокирует таблицы целиком')
+class ToggleConcurrencyTestCase(TransactionTestCase):
+    """Параллельные запросы на добавление и удаление одной связи."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='user', email='u@x.ru')
+        self.author = User.objects.create(username='author', email='a@x.ru')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=1, image='recipes/test.png',
+            image_renditions={'source': 'recipes/test.png'})
+
+    def send_parallel(self, method, url):
+        barrier = Barrier(THREADS)
+
+        def send(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return getattr(client, method)(url).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            return sorted(executor.map(send, range(THREADS)))
+
+    def assert_toggles(self, url, model, counter=None):
+        codes = self.send_parallel('post', url)
+        self.assertEqual(
+            codes,
+            [HTTPStatus.CREATED] + [HTTPStatus.BAD_REQUEST] * (THREADS - 1))
+        self.assertEqual(model.objects.count(), 1)
+        if counter:
+            self.recipe.refresh_from_db()
+            self.assertEqual(getattr(self.recipe, counter), 1)
+
+        codes = self.send_parallel('delete', url)
+        self.assertEqual(
+            codes,
+            [HTTPStatus.NO_CONTENT] + [HTTPStatus.BAD_REQUEST] * (THREADS - 1))
+        self.assertEqual(model.objects.count(), 0)
+        if counter:
+            self.recipe.refresh_from_db()
+            self.assertEqual(getattr(self.recipe, counter), 0)
+
+    def test_favorite(self):
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            Favorite, 'favorites_count')
+
+    def test_shopping_cart(self):
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            ShoppingCart, 'in_carts_count')
+
+    def test_subscribe(self):
+        self.assert_toggles(
+            f'/api/users/{self.author.id}/subscribe/', Subscription)
+
+
+class ToggleTestCase(TestCase):
+    """Повторное добавление и удаление одной связи в одном потоке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        cls.author = User.objects.create(username='author', email='a@x.ru')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            cooking_time=1, image='recipes/test.png',
+            image_renditions={'source': 'recipes/test.png'})
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_toggles(self, url, model, counter=None):
+        for method, code, count in (
+                ('post', HTTPStatus.CREATED, 1),
+                ('post', HTTPStatus.BAD_REQUEST, 1),
+                ('delete', HTTPStatus.NO_CONTENT, 0),
+                ('delete', HTTPStatus.BAD_REQUEST, 0)):
+            response = getattr(self.client, method)(url)
+            self.assertEqual(response.status_code, code, method)
+            self.assertEqual(model.objects.count(), count)
+            if counter:
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), count)
+
+    def test_favorite(self):
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            Favorite, 'favorites_count')
+
+    def test_shopping_cart(self):
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            ShoppingCart, 'in_carts_count')
+
+    def test_subscribe(self):
+        self.assert_toggles(
+            f'/api/users/{self.author.id}/subscribe/', Subscription)
+
+    def test_missing_recipe(self):
+        for method in ('post', 'delete'):
+            response = getattr(self.client, method)(
+                '/api/recipes/0/favorite/')
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class BulkToggleTestCase(TestCase):
+    """Пакетное добавление и удаление рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        author = User.objects.create(username='author', email='a@x.ru')
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {i}', text='Текст',
+                   cooking_time=1, image='recipes/test.png')
+            for i in range(3))
+        cls.ids = [recipe.id for recipe in cls.recipes]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove(self):
+        url = '/api/recipes/shopping_cart/'
+        self.client.post(f'/api/recipes/{self.ids[0]}/shopping_cart/')
+        missing = self.ids[-1] + 1
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                url, {'recipes': [*self.ids, missing]}, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [item['status'] for item in response.json()],
+            ['exists', 'added', 'added', 'not_found'])
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('in_carts_count', flat=True)),
+            [1, 1, 1])
+
+        response = self.client.delete(
+            url, {'recipes': self.ids[:2]}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.json()],
+            ['removed', 'removed'])
+
+        response = self.client.delete(url)
+        self.assertEqual(
+            response.json(), [{'id': self.ids[2], 'status': 'removed'}])
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_favorite(self):
+        response = self.client.post(
+            '/api/recipes/favorite/', {'recipes': self.ids}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.json()], ['added'] * 3)
+        self.assertEqual(
+            set(Recipe.objects.values_list('favorites_count', flat=True)),
+            {1})
+
+    def test_invalid(self):
+        for data in ({}, {'recipes': []}, {'recipes': ['x']},
+                     {'recipes': list(range(1, 102))}):
+            response = self.client.post(
+                '/api/recipes/favorite/', data, format='json')
+            self.assertEqual(
+                response.status_code, HTTPStatus.BAD_REQUEST, data)
+
+
+class CountersTestCase(TestCase):
+    """Счётчики при изменениях через ORM и у строк без пересчёта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user', email='u@x.ru')
+        cls.author = User.objects.create(username='author', email='a@x.ru')
+        # строки, созданные до появления счётчиков: счётчики равны нулю
+        cls.recipe = Recipe.objects.bulk_create([Recipe(
+            author=cls.author, name='Рецепт', text='Текст',
+            cooking_time=1, image='recipes/test.png')])[0]
+        Favorite.objects.bulk_create(
+            [Favorite(user=cls.user, recipe=cls.recipe)])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_stale_counters(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_orm_changes(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=1, image='recipes/test.png')
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+        favorite = Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (1, 1))
+        favorite.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+        recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
@@ -1,21 +1,310 @@
-from http import HTTPStatus
+"""
+Регрессионные тесты производительности API.
 
-from api import models
-from django.test import Client, TestCase
+На наборе данных, близком к рабочему (scripts/seed.py), для каждого
+эндпоинта api/urls.py проверяется верхняя граница числа запросов к
+базе, а для списков - что оно не зависит от размера страницы.
+Время ответов по умолчанию не замеряется: число запросов от объёма
+данных не зависит, и набор засевается в уменьшенном виде.
+PERF_BASELINES=check сравнивает медианное время GET-запросов с базовым
+из perf_baselines.json (отдельно для SQLite и PostgreSQL) с запасом
+PERF_TOLERANCE раз, PERF_BASELINES=update перезаписывает базовые
+значения; в обоих режимах набор засевается полностью, как при записи
+базовых значений.
+"""
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from recipes.models import Recipe
+from scripts import seed
+from users.models import User
+
+BASELINES_FILE = Path(__file__).with_name('perf_baselines.json')
+BASELINES_MODE = os.getenv('PERF_BASELINES', 'off')
+TIMED = BASELINES_MODE in ('check', 'update')
+# Полный набор, на котором записаны базовые значения, и уменьшенный.
+SEED_SIZES = (
+    {'users': 300, 'authors': 60, 'ingredients': 500, 'recipes': 3000}
+    if TIMED else
+    {'users': 60, 'authors': 30, 'ingredients': 100, 'recipes': 600})
+TOLERANCE = float(os.getenv('PERF_TOLERANCE', 3))
+# Запас на шум таймера для быстрых ответов, мс.
+TIMING_SLACK = 20
+TIMING_REPEAT = 5
+PAGE_SIZES = (1, 10, 50)
+GIF = ('data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///'
+       'yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def load_baselines():
+    if not BASELINES_FILE.exists():
+        return {}
+    return json.loads(BASELINES_FILE.read_text())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryBudgetTestCase(TestCase):
+    """Число запросов к базе и время ответа каждого эндпоинта."""
+
+    baselines = load_baselines()
+    timings = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(0)
+        users = seed.create_users(SEED_SIZES['users'], prefix='perf')
+        authors = users[:SEED_SIZES['authors']]
+        tags = seed.create_tags(10, prefix='perf')
+        cls.ingredients = seed.create_ingredients(
+            SEED_SIZES['ingredients'], prefix='perf')
+        recipes = seed.create_recipes(
+            authors, SEED_SIZES['recipes'], tags, cls.ingredients, 8)
+        seed.create_subscriptions(users, authors, 20)
+        # последние рецепты свободны для проверки добавления
+        for user in users[:50]:
+            seed.fill_cart(user, random.sample(recipes[:-100], 20))
+            seed.fill_favorites(user, random.sample(recipes[:-100], 50))
+        call_command('recount', feed=True, stdout=StringIO())
+
+        cls.user = users[0]
+        cls.author = authors[1]
+        cls.recipe = recipes[0]
+        cls.tag = tags[0]
+        cls.token = Token.objects.create(user=cls.user)
+        cls.admin = User.objects.create(
+            username='perfadmin', email='perfadmin@example.com',
+            is_staff=True)
+        cls.other_recipes = [
+            recipe.id for recipe in recipes[-50:]
+            if recipe.author_id != cls.user.id]
+        # Отложенные проверки внешних ключей выполняются один раз здесь,
+        # иначе PostgreSQL повторяет их при откате каждого теста.
+        connection.check_constraints()
+        if connection.vendor == 'postgresql':
+            # статистика планировщика по засеянным таблицам, как в работе
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        if BASELINES_MODE == 'update' and cls.timings:
+            baselines = load_baselines()
+            baselines[connection.vendor] = dict(sorted(cls.timings.items()))
+            BASELINES_FILE.write_text(
+                json.dumps(baselines, indent=2, sort_keys=True) + '\n')
 
-class FoodgramAPITestCase(TestCase):
     def setUp(self):
-        self.guest_client = Client()
-
-    def test_list_exists(self):
-        """Проверка доступности списка рецептов."""
-        response = self.guest_client.get('/api/recipes/')
-        self.assertEqual(response.status_code, HTTPStatus.OK)
-
-    def test_task_creation(self):
-        """Проверка создания рецепта."""
-        data = {'title': 'Test', 'description': 'Test'}
-        response = self.guest_client.post('/api/recipes/', data=data)
-        self.assertEqual(response.status_code, HTTPStatus.CREATED)
-        self.assertTrue(models.Task.objects.filter(title='Test').exists())
+        token_cache.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # прогрев кеша токенов и списков пользователя
+        self.client.get('/api/users/me/')
+        self.client.get(f'/api/recipes/{self.recipe.id}/')
+
+    def request(self, method, path, data=None, status=200):
+        response = getattr(self.client, method)(path, data, format='json')
+        if response.status_code != status:
+            self.fail(f'{method.upper()} {path}: {response.status_code}, '
+                      f'{getattr(response, "content", b"").decode()}')
+        return response
+
+    def assertQueries(self, budget, method, path, data=None, status=200):
+        """Запрос укладывается в budget обращений к базе."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(method, path, data, status)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{method.upper()} {path}: {len(queries)} запросов при '
+            f'бюджете {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries))
+        return response, len(queries)
+
+    def assertGet(self, name, budget, path, data=None):
+        """
+        Повторный GET (кеши прогреты) укладывается в бюджет, а его
+        медианное время - в базовое значение с запасом, если замер
+        включён.
+        """
+        self.request('get', path, data)
+        response, count = self.assertQueries(budget, 'get', path, data)
+        if not TIMED:
+            return response, count
+        timings = []
+        for _ in range(TIMING_REPEAT):
+            started = time.perf_counter()
+            self.request('get', path, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        median = round(statistics.median(timings), 2)
+        self.timings[name] = median
+        baseline = self.baselines.get(connection.vendor, {}).get(name)
+        if BASELINES_MODE == 'check' and baseline is not None:
+            self.assertLess(
+                median, baseline * TOLERANCE + TIMING_SLACK,
+                f'{name}: {median} мс при базовом {baseline} мс')
+        return response, count
+
+    def assertPages(self, name, budget, path, data=None):
+        """
+        Число запросов не зависит от размера страницы; на последней
+        странице записей больше, чем на предпоследней.
+        """
+        counts, lengths = {}, []
+        for size in PAGE_SIZES:
+            response, counts[size] = self.assertGet(
+                f'{name}[{size}]', budget, path, {**(data or {}),
+                                                  'limit': size})
+            lengths.append(len(response.json()['results']))
+        self.assertEqual(len(set(counts.values())), 1, counts)
+        self.assertGreater(lengths[-1], PAGE_SIZES[-2], lengths)
+
+    def test_recipe_lists(self):
+        self.assertPages('recipes.list', 4, '/api/recipes/')
+        self.assertPages('recipes.list.cursor', 3, '/api/recipes/',
+                         {'cursor': ''})
+        self.assertPages('recipes.list.page', 4, '/api/recipes/',
+                         {'page': 3})
+        self.assertPages('recipes.list.tags', 4, '/api/recipes/',
+                         {'tags': self.tag.slug})
+        self.assertPages('recipes.list.author', 4, '/api/recipes/',
+                         {'author': self.author.id})
+        self.assertPages('recipes.list.favorited', 4, '/api/recipes/',
+                         {'is_favorited': 1})
+        self.assertPages('recipes.list.cart', 4, '/api/recipes/',
+                         {'is_in_shopping_cart': 1})
+        self.assertPages('recipes.list.search', 4, '/api/recipes/',
+                         {'search': 'Рецепт'})
+        self.assertPages('recipes.feed', 5, '/api/recipes/feed/')
+
+    def test_recipe_lists_anonymous(self):
+        self.client.credentials()
+        self.assertPages('recipes.list.anonymous', 4, '/api/recipes/')
+
+    def test_recipe_detail(self):
+        self.assertGet('recipes.detail', 3, f'/api/recipes/{self.recipe.id}/')
+
+    def test_user_lists(self):
+        self.assertPages('users.list', 2, '/api/users/')
+        self.assertPages('users.subscriptions', 3,
+                         '/api/users/subscriptions/', {'recipes_limit': 3})
+        self.assertPages('users.subscriptions.all_recipes', 3,
+                         '/api/users/subscriptions/')
+
+    def test_user_detail(self):
+        self.assertGet('users.me', 1, '/api/users/me/')
+        self.assertGet('users.detail', 1, f'/api/users/{self.author.id}/')
+
+    def test_catalog(self):
+        self.assertGet('tags.list', 0, '/api/tags/')
+        self.assertGet('tags.detail', 0, f'/api/tags/{self.tag.id}/')
+        self.assertGet('ingredients.list', 0, '/api/ingredients/')
+        self.assertGet('ingredients.detail', 0,
+                       f'/api/ingredients/{self.ingredients[0].id}/')
+        self.assertGet('ingredients.search', 0, '/api/ingredients/',
+                       {'name': 'perf 1'})
+
+    def test_shopping_cart_downloads(self):
+        self.assertGet('cart.totals', 1, '/api/recipes/shopping_cart/totals/')
+        for file_type in ('txt', 'csv', 'pdf'):
+            self.assertGet(f'cart.download.{file_type}', 0,
+                           '/api/recipes/download_shopping_cart/',
+                           {'type': file_type})
+
+    def test_metrics(self):
+        self.client.force_authenticate(self.admin)
+        self.assertGet('metrics', 0, '/api/metrics/')
+
+    def test_favorite_and_cart_toggles(self):
+        recipe_id = self.other_recipes[0]
+        for relation in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{recipe_id}/{relation}/'
+            self.assertQueries(5, 'post', path, status=201)
+            self.assertQueries(4, 'delete', path, status=204)
+            self.assertQueries(4, 'delete', path, status=400)
+
+    def test_bulk_toggles(self):
+        for relation in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{relation}/'
+            counts = set()
+            for size in PAGE_SIZES:
+                data = {'recipes': self.other_recipes[:size]}
+                counts.add(self.assertQueries(
+                    4, 'post', path, data, status=200)[1])
+                counts.add(self.assertQueries(
+                    4, 'delete', path, data, status=200)[1])
+            self.assertEqual(len(counts), 1, counts)
+
+    def test_subscribe(self):
+        path = f'/api/users/{self.admin.id}/subscribe/'
+        self.assertQueries(7, 'post', path, status=201)
+        self.assertQueries(5, 'delete', path, status=204)
+        self.assertQueries(4, 'delete', path, status=400)
+
+    def test_recipe_write(self):
+        counts = set()
+        # бюджеты совпадают с QUERY_BUDGETS: профилировщик не предупреждает
+        with self.assertNoLogs('api.profiling', 'WARNING'):
+            for size in PAGE_SIZES:
+                counts.add(self.write_recipe(size))
+        self.assertEqual(len(counts), 1, counts)
+        self.assertFalse(Recipe.objects.filter(name__startswith='Рецепт на')
+                         .exists())
+
+    def write_recipe(self, size):
+        """Создание, изменение и удаление рецепта с size ингредиентами."""
+        data = {
+            'ingredients': [{'id': ingredient.id, 'amount': 5}
+                            for ingredient in self.ingredients[:size]],
+            'tags': [self.tag.id],
+            'image': GIF,
+            'name': f'Рецепт на {size}',
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+        response, count = self.assertQueries(
+            15, 'post', '/api/recipes/', data, status=201)
+        recipe_id = response.json()['id']
+        data['ingredients'] = data['ingredients'][::-1]
+        self.assertQueries(
+            12, 'patch', f'/api/recipes/{recipe_id}/', data)
+        self.assertQueries(
+            12, 'delete', f'/api/recipes/{recipe_id}/', status=204)
+        return count
+
+    def test_auth(self):
+        self.client.credentials()
+        self.assertQueries(4, 'post', '/api/users/', {
+            'email': 'new@example.com', 'username': 'new',
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'password': 'Secret-pass-42',
+        }, status=201)
+        response, _ = self.assertQueries(
+            6, 'post', '/api/auth/token/login/',
+            {'email': 'new@example.com', 'password': 'Secret-pass-42'})
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}')
+        self.assertQueries(2, 'post', '/api/users/set_password/', {
+            'current_password': 'Secret-pass-42',
+            'new_password': 'Other-pass-42',
+        }, status=204)
+        self.assertQueries(
+            3, 'post', '/api/auth/token/logout/', status=204)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -5,7 +6,8 @@ from api.views import (
     RecipeViewSet,
     IngredientViewSet,
     TagViewSet,
-    CustomUserViewSet
+    CustomUserViewSet,
+    metrics_view,
 )
 
 
@@ -20,4 +22,10 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 urlpatterns = (
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', metrics_view, name='metrics'),
 )
+
+if settings.ASYNC_VIEWS:
+    from api.async_views import urlpatterns as async_urlpatterns
+
+    urlpatterns = (*async_urlpatterns, *urlpatterns)
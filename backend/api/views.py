@@ -1,26 +1,44 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import (
+    Exists,
+    OuterRef,
+    Prefetch,
+    prefetch_related_objects,
+)
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from fpdf import FPDF
 from rest_framework import status, viewsets
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from djoser.views import UserViewSet
 
 
-from api.filters import RecipeFilter, SearchingFilter
+from api.cache import CachedReadOnlyMixin
+from api.filters import RecipeFilter
+from api.pagination import RecipePagination
+from api.profiling import metrics
+from recipes.autocomplete import ingredient_index
+from recipes.feed import get_feed
+from recipes.membership import UserRecipeLists
+from recipes.services import (
+    get_cart_ingredients,
+    toggle_recipe_relation,
+    toggle_recipe_relations,
+    toggle_subscription,
+)
 from recipes.models import (
-    IngredientAmount,
     Ingredient,
     Favorite,
     Recipe,
     ShoppingCart,
     Tag,
 )
+from recipes.validators import is_digits
 from api.permissions import AuthorOrReadOnly
+from api.shopping_list import FILE_TYPES, shopping_list_response
 from api.serializers import (
+    RecipeIdsSerializer,
     RecipeSerializer,
     SmallRecipeSerializer,
     IngredientSerializer,
@@ -37,33 +55,92 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.with_user_state(self.request.user)
+        return Recipe.objects.all()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_rendition'] = (
+            'card' if self.action in ('list', 'feed') else 'full')
+        context['recipe_lists'] = UserRecipeLists(self.request.user)
+        return context
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self.reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
+
+    def reload_instance(self, serializer):
+        """
+        Повторная загрузка рецепта для ответа с постоянным числом
+        запросов.
+        """
+        serializer.instance = Recipe.objects.with_user_state(
+            self.request.user).get(pk=serializer.instance.pk)
 
     def add(self, model, user, pk, name):
         """Добавление рецепта в список пользователя."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        relation = model.objects.filter(user=user, recipe=recipe)
-        if relation.exists():
+        recipe_id = self.get_recipe_id(pk)
+        if not toggle_recipe_relation(model, user.id, recipe_id, add=True):
+            get_object_or_404(Recipe, pk=recipe_id)
             return Response(
                 {'errors': f'Нельзя повторно добавить рецепт в {name}'},
                 status=status.HTTP_400_BAD_REQUEST)
-        model.objects.create(user=user, recipe=recipe)
-        serializer = SmallRecipeSerializer(recipe)
+        serializer = SmallRecipeSerializer(Recipe.objects.get(pk=recipe_id))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_relation(self, model, user, pk, name):
         """Удаление рецепта из списка пользователя."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        relation = model.objects.filter(user=user, recipe=recipe)
-        if not relation.exists():
+        recipe_id = self.get_recipe_id(pk)
+        if not toggle_recipe_relation(model, user.id, recipe_id, add=False):
+            get_object_or_404(Recipe, pk=recipe_id)
             return Response(
-                {'errors': 'Такой рецепт уже существует!'},
+                {'errors': f'Рецепта нет в {name}'},
                 status=status.HTTP_400_BAD_REQUEST)
-        relation.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_relation(self, model, request):
+        """
+        Пакетное добавление или удаление рецептов из списка пользователя.
+        Все id обрабатываются одним запросом в одной транзакции, в ответе
+        для каждого id указан результат. DELETE без поля recipes очищает
+        список целиком.
+        """
+        user = request.user
+        if request.method == 'DELETE' and 'recipes' not in request.data:
+            removed = toggle_recipe_relations(model, user.id, None, add=False)
+            return Response(
+                [{'id': pk, 'status': 'removed'} for pk in sorted(removed)])
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        add = request.method == 'POST'
+        changed = toggle_recipe_relations(model, user.id, recipe_ids, add)
+        unchanged = set(recipe_ids) - changed
+        existing = set()
+        if unchanged:
+            existing = set(Recipe.objects.filter(
+                pk__in=unchanged).values_list('pk', flat=True))
+        done, skipped = ('added', 'exists') if add else ('removed', 'absent')
+        return Response([
+            {'id': pk,
+             'status': (done if pk in changed
+                        else skipped if pk in existing else 'not_found')}
+            for pk in recipe_ids
+        ])
+
+    def get_recipe_id(self, pk):
+        if not is_digits(pk):
+            raise Http404
+        return int(pk)
+
     @action(methods=['post', 'delete'], detail=True, url_path='favorite',
             url_name='favorite')
     def favorite(self, request, pk=None):
@@ -73,7 +150,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             name = 'избранное'
             return self.add(Favorite, user, pk, name)
         if request.method == 'DELETE':
-            name = 'избранного'
+            name = 'избранном'
             return self.delete_relation(Favorite, user, pk, name)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -86,53 +163,85 @@ class RecipeViewSet(viewsets.ModelViewSet):
             name = 'список покупок'
             return self.add(ShoppingCart, user, pk, name)
         if request.method == 'DELETE':
-            name = 'списка покупок'
+            name = 'списке покупок'
             return self.delete_relation(ShoppingCart, user, pk, name)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    @action(methods=['post', 'delete'], detail=False, url_path='favorite',
+            url_name='favorite_bulk', permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        """Пакетное добавление и удаление рецептов - Избранное."""
+        return self.bulk_relation(Favorite, request)
+
+    @action(methods=['post', 'delete'], detail=False,
+            url_path='shopping_cart', url_name='shopping_cart_bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        """Пакетное добавление и удаление рецептов - Список покупок."""
+        return self.bulk_relation(ShoppingCart, request)
+
+    @action(methods=['get'], detail=False, url_path='shopping_cart/totals',
+            url_name='shopping_cart_totals',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_totals(self, request):
+        """Суммарное количество ингредиентов из списка покупок."""
+        return Response(list(get_cart_ingredients(request.user)))
+
+    @action(methods=['get'], detail=False,
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        paginator = self.pagination_class()
+        page = paginator.paginate_positions(
+            lambda position, limit: get_feed(request.user, position, limit),
+            request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(methods=['get'], detail=False, url_path='download_shopping_cart',
-            url_name='download_shopping_cart')
+            url_name='download_shopping_cart',
+            permission_classes=[IsAuthenticated])
     def download_cart(self, request):
-        """Формирование и скачивание списка покупок."""
-        user = request.user
-        ingredients = IngredientAmount.objects.filter(
-            recipe__recipe_shopping_cart__user__id=user.id).values(
-                'ingredient__name', 'ingredient__measurement_unit').annotate(
-                    Sum('amount', distinct=True))
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.add_font(
-            'DejaVu', '', './recipes/fonts/DejaVuSansCondensed.ttf', uni=True)
-        pdf.set_font('DejaVu', size=14)
-        pdf.cell(txt='Ваш список покупок:', center=True)
-        pdf.ln(8)
-        for i, ingredient in enumerate(ingredients):
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['amount__sum']
-            pdf.cell(40, 10, f'{i + 1}) {name} - {amount} {unit}')
-            pdf.ln()
-        file = pdf.output(dest='S')
-        response = HttpResponse(
-            content_type='application/pdf', status=status.HTTP_200_OK)
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.pdf"')
-        response.write(bytes(file))
-        return response
-
-
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+        """
+        Скачивание списка покупок.
+        Формат файла задаётся параметром type: pdf (по умолчанию), txt, csv.
+        """
+        file_type = request.query_params.get('type', 'pdf')
+        if file_type not in FILE_TYPES:
+            return Response(
+                {'errors': f'Доступные форматы: {", ".join(FILE_TYPES)}'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return shopping_list_response(request.user, file_type)
+
+
+class TagViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedReadOnlyMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = [SearchingFilter]
-    search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Автодополнение по началу названия из индекса в памяти.
+        Параметры: name, limit, fuzzy - допускать одну опечатку.
+        """
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not is_digits(limit):
+                return Response(
+                    {'errors': 'limit должен быть целым числом'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            limit = int(limit)
+        fuzzy = request.query_params.get('fuzzy') in ('1', 'true')
+        return Response(ingredient_index.search(name, limit, fuzzy))
 
 
 class CustomUserViewSet(UserViewSet):
@@ -140,43 +249,79 @@ class CustomUserViewSet(UserViewSet):
 
     queryset = User.objects.all()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action in ('list', 'retrieve') and user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))))
+        return queryset
+
     @action(detail=False, url_path='subscriptions',
             url_name='subscriptions', permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         """Список авторов, на которых подписан пользователь."""
         user = request.user
-        queryset = user.follower.all()
+        queryset = user.follower.select_related('author').order_by('id')
         pages = self.paginate_queryset(queryset)
+        self.prefetch_author_recipes(
+            pages, request.query_params.get('recipes_limit'))
         serializer = SubscriptionSerializer(
             pages, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
 
+    def prefetch_author_recipes(self, subscriptions, limit):
+        """
+        Рецепты всех авторов страницы подписок одним запросом,
+        независимо от числа авторов.
+        """
+        recipes = Recipe.objects.all()
+        if limit and is_digits(limit):
+            recipes = recipes.latest_per_author(int(limit))
+        prefetch_related_objects(
+            subscriptions,
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='latest_recipes'),
+        )
+
     @action(methods=['post', 'delete'], detail=True, url_path='subscribe',
             url_name='subscribe', permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
         """Подписка на автора."""
         user = request.user
-        author = get_object_or_404(User, id=id)
-        if user == author:
+        if not is_digits(id):
+            raise Http404
+        author_id = int(id)
+        if user.id == author_id:
             return Response(
                 {'errors': 'На себя нельзя подписаться / отписаться'},
                 status=status.HTTP_400_BAD_REQUEST)
-        subscription = Subscription.objects.filter(
-            author=author, user=user)
         if request.method == 'POST':
-            if subscription.exists():
+            if not toggle_subscription(user.id, author_id, add=True):
+                get_object_or_404(User, id=author_id)
                 return Response(
                     {'errors': 'Нельзя подписаться повторно'},
                     status=status.HTTP_400_BAD_REQUEST)
-            queryset = Subscription.objects.create(author=author, user=user)
+            subscription = Subscription.objects.select_related(
+                'author').get(user=user, author_id=author_id)
+            self.prefetch_author_recipes(
+                [subscription], request.query_params.get('recipes_limit'))
             serializer = SubscriptionSerializer(
-                queryset, context={'request': request})
+                subscription, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if not subscription.exists():
+            if not toggle_subscription(user.id, author_id, add=False):
+                get_object_or_404(User, id=author_id)
                 return Response(
                     {'errors': 'Нельзя отписаться повторно'},
                     status=status.HTTP_400_BAD_REQUEST)
-            subscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Показатели профилирования запросов в формате Prometheus."""
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4')
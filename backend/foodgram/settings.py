@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -66,10 +67,20 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Асинхронные представления чтения (api/async_views.py) для запуска
+# через ASGI: gunicorn foodgram.asgi -k uvicorn.workers.UvicornWorker.
+# Под ASGI каждый запрос работает с базой в своём потоке, поэтому
+# постоянные подключения по умолчанию выключены - используйте пулер.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# С PgBouncer в режиме transaction pooling серверные курсоры
+# недоступны: соседние запросы могут попасть в разные подключения.
+DB_POOLER = os.getenv('DB_POOLER') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
@@ -77,10 +88,27 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 6432 if DB_POOLER else 5432),
+        'CONN_MAX_AGE': int(
+            os.getenv('DB_CONN_MAX_AGE', 0 if ASYNC_VIEWS else 60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOLER,
     }
 }
 
+# Версии справочников, списков покупок и кеши пользователей должны быть
+# общими для всех воркеров: при WEB_CONCURRENCY > 1 (число воркеров
+# gunicorn) кеш в памяти процесса не пропускает проверка api.E003.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -114,7 +142,7 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS':
         'api.pagination.LimitPagination',
@@ -144,6 +172,41 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_RENDITIONS = {'thumb': 160, 'card': 480, 'full': 1280}
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'webp')
+IMAGE_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_RENDITIONS_SYNC = False
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60 * 24
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+API_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPES_BULK_LIMIT = 100
+RECIPE_SEARCH_TRIGRAM = os.getenv('RECIPE_SEARCH_TRIGRAM') == 'True'
+RECIPE_SEARCH_TRIGRAM_THRESHOLD = 0.3
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL = 100
+
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_CACHE_SHARED = os.getenv('AUTH_TOKEN_CACHE_SHARED') == 'True'
+
+# Профилирование запросов (api/profiling.py), показатели на /api/metrics/.
+# Синхронный middleware при ASGI уводит асинхронные представления
+# в поток, поэтому вместе с ASYNC_VIEWS по умолчанию выключено.
+REQUEST_PROFILING = os.getenv(
+    'REQUEST_PROFILING', str(not ASYNC_VIEWS)) == 'True'
+QUERY_BUDGET = 10
+# Совпадают с бюджетами записи рецепта в api/tests.py.
+QUERY_BUDGETS = {
+    'RecipeViewSet.create': 15,
+    'RecipeViewSet.update': 12,
+    'RecipeViewSet.partial_update': 12,
+    'RecipeViewSet.destroy': 12,
+}
+if REQUEST_PROFILING:
+    MIDDLEWARE.insert(0, 'api.profiling.ProfilingMiddleware')
+
 CSRF_TRUSTED_ORIGINS = ['https://foodgram-pierdunne.ddns.net']
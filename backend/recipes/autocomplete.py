@@ -0,0 +1,93 @@
+"""
+Индекс автодополнения ингредиентов в памяти процесса.
+
+Каталог небольшой и меняется редко, поэтому он целиком загружается
+в отсортированный массив, а поиск по префиксу выполняется бинарным
+поиском без обращения к базе. Индекс перестраивается при смене версии
+модели Ingredient в кеше: сигналы сохранения и удаления ингредиентов
+меняют её, и при общем кеше индекс обновляется во всех процессах.
+"""
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from recipes.services import get_model_version
+
+FUZZY_MIN_LENGTH = 3
+
+
+def fold(value):
+    """Нормализация строки для поиска: регистр и «ё»."""
+    return value.casefold().replace('ё', 'е').strip()
+
+
+def within_one_edit(first, second):
+    """Строки отличаются не более чем на одну вставку, замену или удаление."""
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    i = 0
+    while i < len(first) and first[i] == second[i]:
+        i += 1
+    if len(first) == len(second):
+        return first[i + 1:] == second[i + 1:]
+    return first[i:] == second[i + 1:]
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # ключи и записи заменяются одним присваиванием, чтобы поиск
+        # без блокировки не увидел ключи одной версии и записи другой
+        self._index = ([], [])
+
+    def _build(self, version):
+        entries = sorted(
+            (fold(name), pk, name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        )
+        self._index = (
+            [key for key, *_ in entries],
+            [{'id': pk, 'name': name, 'measurement_unit': unit}
+             for _, pk, name, unit in entries],
+        )
+        self._version = version
+
+    def _load(self):
+        version, _ = get_model_version(Ingredient)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+        return self._index
+
+    def search(self, query, limit=None, fuzzy=False):
+        """
+        Ингредиенты, название которых начинается с query.
+        При fuzzy=True добавляются названия, префикс которых отличается
+        от query одной опечаткой.
+        """
+        keys, items = self._load()
+        query = fold(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', start)
+        result = items[start:end][:limit]
+        if (fuzzy and len(query) >= FUZZY_MIN_LENGTH
+                and (limit is None or len(result) < limit)):
+            size = len(query)
+            for i, key in enumerate(keys):
+                if start <= i < end:
+                    continue
+                if any(within_one_edit(query, key[:size + delta])
+                       for delta in (-1, 0, 1)):
+                    result.append(items[i])
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,160 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Гибридная схема. Новый рецепт сразу раздаётся в таблицу FeedEntry
+всем подписчикам автора (fan-out on write), а при подписке туда
+копируются FEED_BACKFILL последних рецептов автора. Лента читается
+по индексу (user, -pub_date, -recipe) без соединений.
+Авторов, у которых подписчиков больше FEED_FANOUT_LIMIT, не раздают:
+их рецепты добавляются к ленте при чтении (fan-out on read) по индексу
+(author, -pub_date, -id).
+Когда число подписчиков автора превышает порог, его записи удаляются
+из лент; когда опускается до порога, подписчикам раздаются его
+FEED_BACKFILL последних рецептов, в том числе опубликованные, пока
+автор был популярным.
+"""
+from heapq import merge
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+ORDERING = ('-pub_date', '-id')
+
+
+def tables():
+    quote = connection.ops.quote_name
+    return {
+        'feed': quote(FeedEntry._meta.db_table),
+        'recipe': quote(Recipe._meta.db_table),
+        'subscription': quote(Subscription._meta.db_table),
+        'user': quote(User._meta.db_table),
+    }
+
+
+def fan_out_recipe(recipe):
+    """Раздача нового рецепта подписчикам автора одним INSERT ... SELECT."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+            'SELECT s.user_id, r.id, r.author_id, r.pub_date '
+            'FROM {recipe} r '
+            'JOIN {user} a ON a.id = r.author_id '
+            'JOIN {subscription} s ON s.author_id = r.author_id '
+            'WHERE r.id = %s AND a.followers_count <= %s '
+            'ON CONFLICT DO NOTHING'.format(**tables()),
+            [recipe.pk, settings.FEED_FANOUT_LIMIT],
+        )
+        return cursor.rowcount
+
+
+def add_author(user_id, author_id):
+    """Последние рецепты автора в ленту нового подписчика."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+            'SELECT %s, r.id, r.author_id, r.pub_date '
+            'FROM {recipe} r JOIN {user} a ON a.id = r.author_id '
+            'WHERE r.author_id = %s AND a.followers_count <= %s '
+            'ORDER BY r.pub_date DESC, r.id DESC LIMIT %s '
+            'ON CONFLICT DO NOTHING'.format(**tables()),
+            [user_id, author_id, settings.FEED_FANOUT_LIMIT,
+             settings.FEED_BACKFILL],
+        )
+        return cursor.rowcount
+
+
+def add_author_to_followers(author_id):
+    """Последние рецепты автора в ленты всех его подписчиков."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+            'SELECT s.user_id, r.id, r.author_id, r.pub_date '
+            'FROM {subscription} s JOIN ('
+            'SELECT id, author_id, pub_date FROM {recipe} '
+            'WHERE author_id = %s '
+            'ORDER BY pub_date DESC, id DESC LIMIT %s'
+            ') r ON r.author_id = s.author_id '
+            'WHERE s.author_id = %s '
+            'ON CONFLICT DO NOTHING'.format(**tables()),
+            [author_id, settings.FEED_BACKFILL, author_id],
+        )
+        return cursor.rowcount
+
+
+def remove_author_from_followers(author_id):
+    """Удаление рецептов автора из лент всех подписчиков."""
+    return FeedEntry.objects.filter(author_id=author_id).delete()[0]
+
+
+def remove_author(user_id, author_id):
+    """Удаление рецептов автора из ленты отписавшегося."""
+    return FeedEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()[0]
+
+
+def rebuild(user_ids=None):
+    """
+    Пересборка лент по текущим подпискам и порогу раздачи:
+    всех или только пользователей user_ids.
+    """
+    entries = FeedEntry.objects.all()
+    sql = ('INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+           'SELECT s.user_id, r.id, r.author_id, r.pub_date '
+           'FROM {subscription} s '
+           'JOIN {user} a ON a.id = s.author_id '
+           'JOIN {recipe} r ON r.author_id = s.author_id '
+           'WHERE a.followers_count <= %s').format(**tables())
+    params = [settings.FEED_FANOUT_LIMIT]
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        entries = entries.filter(user_id__in=user_ids)
+        sql += f' AND s.user_id IN ({", ".join(["%s"] * len(user_ids))})'
+        params += user_ids
+    entries.delete()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def after(position, pub_date='pub_date', pk='id'):
+    """Условие keyset-выборки после позиции (pub_date, id)."""
+    if position is None:
+        return Q()
+    return (Q(**{f'{pub_date}__lt': position[0]})
+            | Q(**{pub_date: position[0], f'{pk}__lt': position[1]}))
+
+
+def get_feed(user, position=None, limit=10):
+    """
+    Не более limit рецептов ленты после позиции курсора (pub_date, id).
+    Два запроса по индексам - разосланные записи и рецепты популярных
+    авторов - сливаются по дате; рецепты загружаются третьим запросом
+    вместе со статусами пользователя.
+    """
+    fanned = FeedEntry.objects.filter(
+        after(position, pk='recipe_id'), user=user,
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit]
+    popular = Recipe.objects.filter(
+        after(position),
+        author__in=Subscription.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('author'),
+    ).order_by(*ORDERING).values_list('pub_date', 'id')[:limit]
+    ids = []
+    for _, pk in merge(fanned, popular, reverse=True):
+        if pk not in ids:
+            ids.append(pk)
+        if len(ids) == limit:
+            break
+    if not ids:
+        return []
+    return list(Recipe.objects.with_user_state(user).filter(
+        pk__in=ids).order_by(*ORDERING))
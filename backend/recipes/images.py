@@ -0,0 +1,110 @@
+"""
+Обработка изображений рецептов.
+
+Исходный файл сохраняется под именем, равным хешу содержимого, а
+уменьшенные копии (thumb, card, full) в WebP и JPEG строятся пулом
+фоновых потоков после фиксации транзакции. Пути к готовым копиям
+записываются в Recipe.image_renditions. Копии, на которые больше не
+ссылается ни один рецепт (изображение заменено или рецепт удалён),
+удаляются из хранилища.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='renditions',
+        )
+    return _executor
+
+
+def schedule_renditions(recipe):
+    """Постановка построения копий в очередь после фиксации транзакции."""
+    name = recipe.image.name
+    if not name or recipe.image_renditions.get('source') == name:
+        return
+    if settings.IMAGE_RENDITIONS_SYNC:
+        transaction.on_commit(lambda: build_renditions(recipe.pk, name))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(build_renditions, recipe.pk, name))
+
+
+def render(image, size, image_format):
+    copy = image.copy()
+    copy.thumbnail((size, size))
+    if image_format == 'JPEG' and copy.mode != 'RGB':
+        copy = copy.convert('RGB')
+    buffer = BytesIO()
+    copy.save(buffer, image_format, quality=settings.IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def build_renditions(recipe_id, name):
+    """Построение копий изображения и запись их путей в рецепт."""
+    try:
+        with default_storage.open(name) as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+        stem = PurePosixPath(name).stem
+        renditions = {'source': name}
+        for rendition, size in settings.IMAGE_RENDITIONS.items():
+            renditions[rendition] = {}
+            for extension, image_format in FORMATS.items():
+                path = f'{RENDITIONS_DIR}/{stem}_{rendition}.{extension}'
+                if not default_storage.exists(path):
+                    path = default_storage.save(path, ContentFile(
+                        render(image, size, image_format)))
+                renditions[rendition][extension] = path
+        previous = Recipe.objects.filter(pk=recipe_id).values_list(
+            'image_renditions', flat=True).first()
+        if Recipe.objects.filter(pk=recipe_id, image=name).update(
+                image_renditions=renditions):
+            release_renditions(previous)
+        else:
+            release_renditions(renditions)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        if not settings.IMAGE_RENDITIONS_SYNC:
+            connection.close()
+
+
+def release_renditions(renditions):
+    """Удаление копий, если их исходник не использует другой рецепт."""
+    source = (renditions or {}).get('source')
+    if not source or Recipe.objects.filter(
+            image_renditions__source=source).exists():
+        return
+    for rendition in settings.IMAGE_RENDITIONS:
+        for path in renditions.get(rendition, {}).values():
+            default_storage.delete(path)
+
+
+def rendition_name(instance, rendition):
+    """Путь к готовой копии изображения рецепта или None."""
+    renditions = getattr(instance, 'image_renditions', None) or {}
+    if renditions.get('source') != instance.image.name:
+        return None
+    return renditions.get(rendition, {}).get(settings.IMAGE_FORMAT)
@@ -1,35 +1,128 @@
+import csv
 import json
+import time
+from itertools import chain
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient, Tag
+from recipes.services import bump_model_version
+
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = ' \t\r\n,'
+MODELS = {
+    Tag: ('name', 'color', 'slug'),
+    Ingredient: ('name', 'measurement_unit'),
+}
+KEYS = {
+    Tag: ('slug',),
+    Ingredient: ('name', 'measurement_unit'),
+}
+
+
+def iter_json(file):
+    """Потоковое чтение элементов JSON-массива без загрузки всего файла."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip(SEPARATORS)
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON.')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def is_header(row):
+    """Строка CSV - заголовок с полями одной из моделей."""
+    return set(row) in (set(fields) for fields in MODELS.values())
+
+
+def iter_csv(file):
+    """Строки CSV как словари; без заголовка - название и единица."""
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    if not is_header(header):
+        fields = MODELS[Ingredient]
+        yield dict(zip(fields, header))
+    else:
+        fields = header
+    for row in reader:
+        yield dict(zip(fields, row))
 
 
 class Command(BaseCommand):
+    help = 'Загрузка тегов или ингредиентов из JSON или CSV.'
 
     def add_arguments(self, parser):
         parser.add_argument("--path", type=str, help="file path")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Количество записей в одном INSERT")
 
     def handle(self, *args, **options):
         file_path = options["path"]
+        started = time.perf_counter()
+
+        with open(file_path, encoding='utf-8', newline='') as f:
+            if file_path.endswith('.csv'):
+                lines = iter_csv(f)
+            else:
+                lines = iter_json(f)
+            first = next(lines, None)
+            if first is None:
+                raise CommandError('Файл пуст.')
+            model = Tag if 'color' in first else Ingredient
+            with transaction.atomic():
+                total, added = self.load(
+                    model, chain([first], lines), options['batch_size'])
+
+        bump_model_version(model)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{model.__name__}: прочитано {total}, добавлено {added} '
+            f'за {elapsed:.2f} с ({total / elapsed:.0f} строк/с)'))
 
-        with open(file_path, encoding='utf-8') as f:
-            jsondata = json.load(f)
-            if 'color' in jsondata[0]:
-                for line in jsondata:
-                    if not Tag.objects.filter(
-                       slug=line['slug']).exists():
-                        Tag.objects.create(
-                            name=line['name'],
-                            color=line['color'],
-                            slug=line['slug'],
-                        )
-            elif 'measurement_unit' in jsondata[0]:
-                for line in jsondata:
-                    if not Ingredient.objects.filter(
-                       name=line['name'],
-                       measurement_unit=line['measurement_unit']).exists():
-                        Ingredient.objects.create(
-                            name=line['name'],
-                            measurement_unit=line['measurement_unit']
-                        )
+    def load(self, model, lines, batch_size):
+        """
+        Пакетная вставка записей, которых ещё нет в базе.
+        Уже существующие ключи загружаются одним запросом, а конфликты
+        с параллельной загрузкой пропускает ignore_conflicts. Число
+        добавленных записей - разница количества строк до и после:
+        пропущенные базой строки bulk_create не сообщает.
+        """
+        fields, keys = MODELS[model], KEYS[model]
+        before = model.objects.count()
+        existing = set(model.objects.values_list(*keys))
+        total = 0
+        batch = []
+        for line in lines:
+            total += 1
+            try:
+                values = {field: str(line[field]).strip() for field in fields}
+            except KeyError as error:
+                raise CommandError(
+                    f'Строка {total}: нет поля {error}.') from error
+            key = tuple(values[field] for field in keys)
+            if key in existing:
+                continue
+            existing.add(key)
+            batch.append(model(**values))
+            if len(batch) == batch_size:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+        return total, model.objects.count() - before
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes import feed
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.search import update_search_vectors
+from users.models import Subscription, User
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с количеством строк queryset для внешней записи."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).values(field)
+            .annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт счётчиков: избранное и списки покупок у рецептов, '
+            'количество рецептов и подписчиков у пользователей; пересчёт '
+            'поисковых векторов рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--feed', action='store_true',
+            help='Пересобрать ленты подписок')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_subquery(
+                    Favorite.objects.all(), 'recipe'),
+                in_carts_count=count_subquery(
+                    ShoppingCart.objects.all(), 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_subquery(Recipe.objects.all(), 'author'),
+                followers_count=count_subquery(
+                    Subscription.objects.all(), 'author'),
+            )
+            update_search_vectors(Recipe.objects.all())
+            if options['feed']:
+                entries = feed.rebuild()
+                self.stdout.write(f'Записей в лентах: {entries}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'))
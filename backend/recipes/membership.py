@@ -0,0 +1,125 @@
+"""
+Кеш избранного и списка покупок пользователя.
+
+Чтобы показать для страницы рецептов is_favorited и is_in_shopping_cart,
+не нужны подзапросы EXISTS на каждую строку: id рецептов из избранного
+и списка покупок пользователя хранятся в кеше Django отсортированными
+массивами (8 байт на рецепт), и проверка - двоичный поиск в памяти.
+Массивы загружаются одним запросом при первом обращении.
+Ключ массива содержит версию списка. Любое изменение списка (через API
+или ORM) меняет версию, а не правит массив: снимок, прочитанный из
+базы до фиксации изменения, записывается под старой версией и больше
+не читается. Устаревшие записи истекают через
+MEMBERSHIP_CACHE_TIMEOUT секунд. При нескольких воркерах кеш должен
+быть общим (проверка api.E003), иначе изменения не видны другим
+процессам.
+"""
+from array import array
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Value
+
+from recipes.models import Favorite, ShoppingCart
+
+MEMBERSHIP_KEY = 'membership:{}:{}:{}'
+VERSION_KEY = 'membership:version:{}:{}'
+MODELS = (Favorite, ShoppingCart)
+
+
+def cache_key(model, user_id, version):
+    return MEMBERSHIP_KEY.format(model._meta.model_name, user_id, version)
+
+
+def version_key(model, user_id):
+    return VERSION_KEY.format(model._meta.model_name, user_id)
+
+
+def get_versions(user_id):
+    """Текущие версии избранного и списка покупок пользователя."""
+    keys = {model: version_key(model, user_id) for model in MODELS}
+    cached = cache.get_many(keys.values())
+    versions = {}
+    for model, key in keys.items():
+        version = cached.get(key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions[model] = version
+    return versions
+
+
+def load_memberships(user_id, models):
+    """Id рецептов из списков models пользователя одним запросом."""
+    querysets = [
+        model.objects.filter(user_id=user_id).annotate(
+            kind=Value(index)).values_list('recipe_id', 'kind').order_by()
+        for index, model in enumerate(models)
+    ]
+    ids = [[] for _ in models]
+    for recipe_id, kind in querysets[0].union(*querysets[1:], all=True):
+        ids[kind].append(recipe_id)
+    return {model: array('q', sorted(recipe_ids))
+            for model, recipe_ids in zip(models, ids)}
+
+
+def get_memberships(user_id):
+    """
+    Отсортированные массивы id рецептов из избранного и списка
+    покупок пользователя; недостающие в кеше загружаются из базы.
+    """
+    versions = get_versions(user_id)
+    keys = {model: cache_key(model, user_id, versions[model])
+            for model in MODELS}
+    cached = cache.get_many(keys.values())
+    missing = [model for model in MODELS if keys[model] not in cached]
+    if not missing:
+        return {model: cached[keys[model]] for model in MODELS}
+    loaded = load_memberships(user_id, missing)
+    cache.set_many(
+        {keys[model]: ids for model, ids in loaded.items()},
+        timeout=settings.MEMBERSHIP_CACHE_TIMEOUT,
+    )
+    return {model: cached.get(keys[model], loaded.get(model))
+            for model in MODELS}
+
+
+def reset_membership(model, user_id):
+    """
+    Смена версии списка пользователя при его изменении и ещё раз после
+    фиксации транзакции: снимок, прочитанный другим процессом до
+    фиксации, тоже не будет использован.
+    """
+    def bump():
+        cache.set(version_key(model, user_id), uuid4().hex, timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class UserRecipeLists:
+    """
+    Избранное и список покупок пользователя для сериализаторов;
+    загружаются при первой проверке.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.memberships = None
+
+    def load(self):
+        if self.memberships is None:
+            self.memberships = (
+                get_memberships(self.user.id)
+                if self.user.is_authenticated
+                else dict.fromkeys(MODELS, array('q')))
+        return self
+
+    def contains(self, model, recipe_id):
+        ids = self.load().memberships[model]
+        index = bisect_left(ids, recipe_id)
+        return index < len(ids) and ids[index] == recipe_id
@@ -1,9 +1,14 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 from django.core.validators import RegexValidator
 
+from recipes import search
 from recipes.validators import validate_time
-from users.models import User
+from users.models import Subscription, User
 
 
 class Tag(models.Model):
@@ -39,11 +44,64 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+class SearchVectorIndex(GinIndex):
+    """GIN-индекс в PostgreSQL, обычный индекс в остальных базах."""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(
+                self, model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_state(self, user):
+        """
+        Рецепты со статусом подписки на автора для пользователя,
+        вычисленным в том же запросе. Избранное и список покупок
+        сериализатор берёт из кеша (recipes/membership.py).
+        """
+        if user.is_authenticated:
+            queryset = self.annotate(
+                author_is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('author'))),
+            )
+        else:
+            queryset = self.annotate(author_is_subscribed=Value(False))
+        return queryset.select_related('author').defer(
+            'search_vector',
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientamount_set',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+
+    def latest_per_author(self, limit):
+        """Не более limit последних рецептов каждого автора."""
+        return self.annotate(
+            author_position=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            ),
+        ).filter(author_position__lte=limit)
+
+
 class Recipe(models.Model):
     """Модель рецептов"""
 
@@ -61,15 +119,52 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/'
     )
+    image_renditions = models.JSONField(
+        default=dict, blank=True, editable=False
+    )
     text = models.TextField()
     cooking_time = models.IntegerField(validators=[validate_time])
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False, db_index=True
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            SearchVectorIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Пересчёт поискового вектора в том же запросе, что и сохранение."""
+        update_fields = kwargs.get('update_fields')
+        if search.is_supported() and (update_fields is None or {
+                'name', 'text'} & set(update_fields)):
+            self.search_vector = search.recipe_vector(
+                Value(self.name), Value(self.text))
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+
 
 class IngredientAmount(models.Model):
     """Модель связывающая ингридиенты и количество."""
@@ -87,6 +182,12 @@ class IngredientAmount(models.Model):
                 name='unique_recipe_ingredient'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='ingredient_amount_recipe_idx'
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -110,6 +211,12 @@ class Favorite(models.Model):
                 name='unique_favorite_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='favorite_user_recipe_idx'
+            )
+        ]
 
 
 class ShoppingCart(models.Model):
@@ -133,3 +240,44 @@ class ShoppingCart(models.Model):
                 name='unique_cart_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='shopping_cart_user_recipe_idx'
+            )
+        ]
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, разосланный при публикации."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
@@ -0,0 +1,61 @@
+"""
+Полнотекстовый поиск рецептов.
+
+В PostgreSQL название и текст рецепта хранятся в колонке search_vector
+(tsvector с русской морфологией, название весомее текста) под
+GIN-индексом; колонку пересчитывает Recipe.save тем же запросом.
+Результаты упорядочены по релевантности. Если по запросу ничего не
+нашлось и включён RECIPE_SEARCH_TRIGRAM, ищутся рецепты с похожим
+названием через pg_trgm (нужно CREATE EXTENSION pg_trgm).
+В остальных базах поиск сводится к icontains по названию и тексту.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import F, Q
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def recipe_vector(name='name', text='text'):
+    """Вектор по колонкам рецепта или по переданным выражениям."""
+    return (SearchVector(name, weight='A', config=SEARCH_CONFIG)
+            + SearchVector(text, weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_vectors(queryset):
+    """Пересчёт search_vector у рецептов queryset одним UPDATE."""
+    if not is_supported():
+        return 0
+    return queryset.update(search_vector=recipe_vector())
+
+
+def search_recipes(queryset, query):
+    """Рецепты queryset, подходящие под запрос, от более релевантных."""
+    query = query.strip()
+    if not query:
+        return queryset
+    if not is_supported():
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query))
+    search_query = SearchQuery(
+        query, config=SEARCH_CONFIG, search_type='websearch')
+    found = queryset.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+    ).order_by('-rank', '-pub_date', '-id')
+    if settings.RECIPE_SEARCH_TRIGRAM and not found.exists():
+        return queryset.annotate(
+            rank=TrigramSimilarity('name', query),
+        ).filter(
+            rank__gte=settings.RECIPE_SEARCH_TRIGRAM_THRESHOLD,
+        ).order_by('-rank', '-pub_date', '-id')
+    return found
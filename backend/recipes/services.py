@@ -0,0 +1,252 @@
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from recipes import feed
+from recipes.membership import reset_membership
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+CART_VERSION_KEY = 'shopping_cart:version:{}'
+MODEL_VERSION_KEY = 'models:version:{}'
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def get_cart_ingredients(user):
+    """
+    Ингредиенты из списка покупок пользователя с суммарным количеством.
+    Один сгруппированный запрос: рецепты корзины берутся по индексу
+    (user, recipe), количества - по индексу (recipe, ingredient, amount).
+    """
+    cart = ShoppingCart.objects.filter(user=user.id).values('recipe')
+    return Ingredient.objects.filter(
+        ingredientamount__recipe__in=cart,
+    ).values(
+        'id', 'name', 'measurement_unit',
+    ).annotate(
+        amount=Sum('ingredientamount__amount'),
+    ).order_by('name', 'measurement_unit')
+
+
+def get_cart_version(user_id):
+    """Текущая версия списка покупок пользователя."""
+    key = CART_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cart_version(*user_ids):
+    """
+    Смена версии списка покупок после изменения его содержимого.
+    Версия меняется сразу и ещё раз после фиксации транзакции: файл,
+    собранный параллельным запросом из строк до фиксации, не будет
+    отдан под новой версией.
+    """
+    def bump():
+        cache.set_many(
+            {CART_VERSION_KEY.format(user_id): uuid4().hex
+             for user_id in user_ids},
+            timeout=None,
+        )
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_recipe_carts(recipe_id):
+    """Смена версии списков покупок, в которых есть рецепт."""
+    bump_cart_version(*ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+
+
+def get_model_version(model):
+    """
+    Версия данных модели и время её последнего изменения.
+    Используется кешами, построенными по всей таблице.
+    """
+    key = MODEL_VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = (uuid4().hex, int(time.time()))
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_model_version(model):
+    """
+    Смена версии данных модели после её изменения; ещё раз - после
+    фиксации транзакции, как в bump_cart_version.
+    """
+    def bump():
+        cache.set(
+            MODEL_VERSION_KEY.format(model._meta.label_lower),
+            (uuid4().hex, int(time.time())),
+            timeout=None,
+        )
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def change_recipe_counter(model, recipe_ids, delta):
+    """
+    Изменение счётчика добавлений рецептов в избранное или корзину.
+    Счётчик не опускается ниже нуля, даже если разошёлся с таблицей
+    связей (его восстанавливает manage.py recount).
+    """
+    field = RECIPE_COUNTERS[model]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def change_recipes_count(user_id, delta):
+    """Изменение счётчика рецептов автора; не ниже нуля."""
+    User.objects.filter(pk=user_id).update(
+        recipes_count=Greatest(F('recipes_count') + delta, 0))
+
+
+def change_followers_count(author_id, delta):
+    """
+    Изменение счётчика подписчиков автора; не ниже нуля.
+    Возвращает новое значение счётчика.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {quote(User._meta.db_table)} SET followers_count = '
+            'CASE WHEN followers_count + %s > 0 '
+            'THEN followers_count + %s ELSE 0 END '
+            'WHERE id = %s RETURNING followers_count',
+            [delta, delta, author_id],
+        )
+        row = cursor.fetchone()
+    return row and row[0]
+
+
+def insert_relations(model, user_id, target_field, target_ids):
+    """
+    Связи пользователя с рецептами или авторами одним запросом
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING.
+    Возвращает множество id, для которых связь действительно создана:
+    уже связанные и несуществующие цели в него не попадают.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return set()
+    quote = connection.ops.quote_name
+    target = model._meta.get_field(target_field)
+    target_model = target.related_model
+    target_pk = quote(target_model._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote(model._meta.get_field("user").column)}, '
+            f'{quote(target.column)}) '
+            f'SELECT %s, {target_pk} '
+            f'FROM {quote(target_model._meta.db_table)} '
+            f'WHERE {target_pk} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(target.column)}',
+            [user_id, *target_ids],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_relations(model, user_id, target_field, target_ids=None):
+    """
+    Удаление связей одним запросом DELETE ... RETURNING.
+    Без target_ids удаляются все связи пользователя.
+    Возвращает множество id, связи с которыми были удалены.
+    """
+    quote = connection.ops.quote_name
+    column = quote(model._meta.get_field(target_field).column)
+    sql = (f'DELETE FROM {quote(model._meta.db_table)} '
+           f'WHERE {quote(model._meta.get_field("user").column)} = %s')
+    params = [user_id]
+    if target_ids is not None:
+        target_ids = list(target_ids)
+        if not target_ids:
+            return set()
+        sql += f' AND {column} IN ({", ".join(["%s"] * len(target_ids))})'
+        params += target_ids
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {column}', params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def insert_relation(model, user_id, target_field, target_id):
+    """Создание одной связи; False, если она уже есть или цели нет."""
+    return bool(insert_relations(model, user_id, target_field, [target_id]))
+
+
+def delete_relation(model, user_id, target_field, target_id):
+    """Удаление одной связи; False, если удалять было нечего."""
+    return bool(delete_relations(model, user_id, target_field, [target_id]))
+
+
+def toggle_recipe_relations(model, user_id, recipe_ids, add):
+    """
+    Добавление рецептов в избранное или список покупок либо удаление.
+    При удалении без recipe_ids список очищается целиком.
+    Счётчики рецептов, версия списка покупок и кеш избранного и списка
+    покупок меняются только для строк, которые запрос действительно
+    изменил.
+    Возвращает множество id изменённых рецептов.
+    """
+    with transaction.atomic():
+        if add:
+            changed = insert_relations(model, user_id, 'recipe', recipe_ids)
+        else:
+            changed = delete_relations(model, user_id, 'recipe', recipe_ids)
+        if changed:
+            change_recipe_counter(model, changed, 1 if add else -1)
+            reset_membership(model, user_id)
+            if model is ShoppingCart:
+                bump_cart_version(user_id)
+    return changed
+
+
+def toggle_recipe_relation(model, user_id, recipe_id, add):
+    """Добавление или удаление одного рецепта; True, если строка изменена."""
+    return bool(toggle_recipe_relations(model, user_id, [recipe_id], add))
+
+
+def update_following(user_id, author_id, add):
+    """
+    Счётчик подписчиков автора и лента подписчика после подписки
+    или отписки. Счётчик меняется первым: от него зависит, раздаются
+    ли рецепты автора в ленты. Если счётчик пересёк порог раздачи,
+    меняются ленты всех подписчиков автора.
+    """
+    followers = change_followers_count(author_id, 1 if add else -1)
+    if add:
+        feed.add_author(user_id, author_id)
+        if followers == settings.FEED_FANOUT_LIMIT + 1:
+            feed.remove_author_from_followers(author_id)
+    else:
+        feed.remove_author(user_id, author_id)
+        if followers == settings.FEED_FANOUT_LIMIT:
+            feed.add_author_to_followers(author_id)
+
+
+def toggle_subscription(user_id, author_id, add):
+    """Подписка на автора или отписка; True, если строка изменена."""
+    with transaction.atomic():
+        toggle = insert_relation if add else delete_relation
+        changed = toggle(Subscription, user_id, 'author', author_id)
+        if changed:
+            update_following(user_id, author_id, add)
+    return changed
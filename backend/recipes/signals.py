@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.feed import fan_out_recipe
+from recipes.images import release_renditions, schedule_renditions
+from recipes.membership import reset_membership
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.services import (
+    bump_cart_version,
+    bump_model_version,
+    bump_recipe_carts,
+    change_recipe_counter,
+    change_recipes_count,
+    update_following,
+)
+from users.models import Subscription, User
+
+
+def deleted_with(origin, model):
+    """Удаляется ли строка каскадом вместе с объектом model."""
+    return getattr(origin, 'model', type(origin)) is model
+
+
+def change_relation_counter(sender, instance, signal, created, origin):
+    """
+    Счётчик рецепта при изменении избранного или списка покупок через
+    ORM (админка). API меняет списки запросами без сигналов и счётчики
+    обновляет сам; при удалении рецепта его счётчики не нужны.
+    """
+    if signal is post_save:
+        if created:
+            change_recipe_counter(sender, [instance.recipe_id], 1)
+    elif not deleted_with(origin, Recipe):
+        change_recipe_counter(sender, [instance.recipe_id], -1)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, signal, created=False,
+                          origin=None, **kwargs):
+    """Сброс выгрузки списка покупок при добавлении/удалении рецепта."""
+    bump_cart_version(instance.user_id)
+    reset_membership(sender, instance.user_id)
+    change_relation_counter(sender, instance, signal, created, origin)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_changed(sender, instance, signal, created=False, origin=None,
+                     **kwargs):
+    """Сброс кеша избранного при изменении через ORM."""
+    reset_membership(sender, instance.user_id)
+    change_relation_counter(sender, instance, signal, created, origin)
+
+
+@receiver((post_save, post_delete), sender=IngredientAmount)
+def ingredient_amount_changed(sender, instance, origin=None, **kwargs):
+    """
+    Сброс выгрузок у всех, чей список покупок содержит рецепт.
+    При удалении самого рецепта выгрузки сбрасывает удаление его строк
+    из списков покупок, а запрос на каждый ингредиент не нужен.
+    """
+    if deleted_with(origin, Recipe):
+        return
+    bump_recipe_carts(instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def catalog_changed(sender, **kwargs):
+    """Сброс кешей справочника: ответов API и индекса автодополнения."""
+    bump_model_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created=False, update_fields=None,
+                 **kwargs):
+    """
+    Построение уменьшенных копий нового изображения рецепта,
+    счётчик рецептов автора и раздача нового рецепта в ленты
+    подписчиков.
+    """
+    if update_fields is None or 'image' in update_fields:
+        schedule_renditions(instance)
+    if created:
+        change_recipes_count(instance.author_id, 1)
+        fan_out_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Счётчик рецептов автора и удаление уменьшенных копий изображения
+    удалённого рецепта.
+    """
+    if not deleted_with(origin, User):
+        change_recipes_count(instance.author_id, -1)
+    renditions = instance.image_renditions
+    transaction.on_commit(lambda: release_renditions(renditions))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created=False, **kwargs):
+    """Счётчик подписчиков и лента при подписке через ORM (админка)."""
+    if created:
+        update_following(instance.user_id, instance.author_id, True)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """Счётчик подписчиков и лента при отписке через ORM."""
+    update_following(instance.user_id, instance.author_id, False)
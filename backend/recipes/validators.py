@@ -3,6 +3,15 @@ from rest_framework.validators import ValidationError as RFError
 from recipes import models
 
 
+def is_digits(value):
+    """
+    Строка только из цифр 0-9. str.isdigit пропускает и, например, '²',
+    на котором int падает с ValueError.
+    """
+    value = str(value)
+    return value.isascii() and value.isdecimal()
+
+
 def validate_time(value):
     """Валидация поля модели - время приготовления."""
     if value < 1:
@@ -12,35 +21,61 @@ def validate_time(value):
 
 
 def validate_ingredients(data):
-    """Валидация ингредиентов и количества."""
+    """
+    Валидация ингредиентов и количества.
+    Возвращает список словарей с объектом ингредиента и количеством;
+    наличие всех ингредиентов в БД проверяется одним запросом.
+    """
     if not data:
         raise RFError({'ingredients': ['Обязательное поле.']})
     if len(data) < 1:
         raise RFError({'ingredients': ['Не переданы ингредиенты.']})
-    unique_ingredient = []
+    if not isinstance(data, list):
+        raise RFError({'ingredients': ['Ожидается список ингредиентов.']})
+    amounts = {}
     for ingredient in data:
+        if not isinstance(ingredient, dict):
+            raise RFError({'ingredients': [
+                'Ингредиент должен быть объектом с id и amount.']})
         if not ingredient.get('id'):
             raise RFError({'ingredients': ['Отсутствует id ингредиента.']})
-        id = ingredient.get('id')
-        if not models.Ingredient.objects.filter(id=id).exists():
+        try:
+            id = int(ingredient.get('id'))
+        except (TypeError, ValueError):
             raise RFError({'ingredients': ['Ингредиента нет в БД.']})
-        if id in unique_ingredient:
+        if id in amounts:
             raise RFError(
                 {'ingredients': ['Нельзя дублировать имена ингредиентов.']})
-        unique_ingredient.append(id)
-        amount = int(ingredient.get('amount'))
+        try:
+            amount = int(ingredient.get('amount'))
+        except (TypeError, ValueError):
+            raise RFError({'amount': ['Количество должно быть числом.']})
         if amount < 1:
             raise RFError({'amount': ['Количество не может быть менее 1.']})
-    return data
+        amounts[id] = amount
+    ingredients = models.Ingredient.objects.in_bulk(amounts)
+    if len(ingredients) < len(amounts):
+        raise RFError({'ingredients': ['Ингредиента нет в БД.']})
+    return [
+        {'ingredient': ingredients[id], 'amount': amount}
+        for id, amount in amounts.items()
+    ]
 
 
 def validate_tags(data):
-    """Валидация тэгов: отсутствие в request, отсутствие в БД."""
+    """
+    Валидация тэгов: отсутствие в request, отсутствие в БД.
+    Возвращает объекты тэгов, загруженные одним запросом.
+    """
     if not data:
         raise RFError({'tags': ['Обязательное поле.']})
     if len(data) < 1:
         raise RFError({'tags': ['Хотя бы один тэг должен быть указан.']})
-    for tag in data:
-        if not models.Tag.objects.filter(id=tag).exists():
-            raise RFError({'tags': ['Тэг отсутствует в БД.']})
-    return data
+    try:
+        ids = {int(tag) for tag in data}
+    except (TypeError, ValueError):
+        raise RFError({'tags': ['Тэг отсутствует в БД.']})
+    tags = models.Tag.objects.in_bulk(ids)
+    if len(tags) < len(ids):
+        raise RFError({'tags': ['Тэг отсутствует в БД.']})
+    return list(tags.values())
@@ -0,0 +1,88 @@
+"""
+Нагрузочный тест эндпоинтов чтения.
+
+Запускается отдельно от Django против работающего сервера, чтобы
+сравнить WSGI и ASGI на одинаковой нагрузке:
+
+    gunicorn foodgram.wsgi:application -w 4 --bind 127.0.0.1:8000
+    ASYNC_VIEWS=True gunicorn foodgram.asgi:application -w 4 \
+        -k uvicorn.workers.UvicornWorker --bind 127.0.0.1:8000
+    python scripts/loadtest.py --url http://127.0.0.1:8000 -c 32 -d 10
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name=са',
+    '/api/recipes/',
+    '/api/recipes/?limit=6&page=2',
+    '/api/recipes/{recipe}/',
+)
+
+
+def worker(url, paths, deadline, headers, recipes):
+    session = requests.Session()
+    session.headers.update(headers)
+    timings, errors = [], 0
+    while time.perf_counter() < deadline:
+        path = random.choice(paths).format(recipe=random.choice(recipes))
+        started = time.perf_counter()
+        try:
+            response = session.get(url + path, timeout=30)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        timings.append(time.perf_counter() - started)
+        errors += not ok
+    return timings, errors
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    parser.add_argument('--token', help='Токен для авторизованных запросов')
+    parser.add_argument(
+        '--path', action='append', help='Свой набор путей вместо PATHS')
+    args = parser.parse_args()
+
+    headers = {'Authorization': f'Token {args.token}'} if args.token else {}
+    first_page = requests.get(
+        f'{args.url}/api/recipes/?limit=50', headers=headers, timeout=30)
+    recipes = [item['id'] for item in first_page.json()['results']] or [1]
+    deadline = time.perf_counter() + args.duration
+    barrier = threading.Barrier(args.concurrency)
+
+    def run(_):
+        barrier.wait()
+        return worker(
+            args.url, args.path or PATHS, deadline, headers, recipes)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(executor.map(run, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    timings = sorted(t * 1000 for result, _ in results for t in result)
+    errors = sum(errors for _, errors in results)
+    print(f'запросов: {len(timings)}, ошибок: {errors}, '
+          f'{len(timings) / elapsed:.1f} запр/с')
+    print(f'мс: median {statistics.median(timings):.1f}, '
+          f'p95 {percentile(timings, 0.95):.1f}, '
+          f'p99 {percentile(timings, 0.99):.1f}, max {timings[-1]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
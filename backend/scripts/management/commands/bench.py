@@ -0,0 +1,418 @@
+import base64
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes import feed
+from recipes.management.commands.recount import count_subquery
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            Tag)
+from recipes.search import update_search_vectors
+from recipes.services import bump_model_version
+from scripts import seed
+from users.models import User
+
+# Доля операции в трафике по умолчанию.
+MIX = {
+    'recipes.list': 20,
+    'recipes.list.filtered': 15,
+    'recipes.list.cursor': 10,
+    'recipes.feed': 15,
+    'recipes.detail': 10,
+    'ingredients.autocomplete': 15,
+    'favorite.toggle': 6,
+    'cart.toggle': 5,
+    'recipes.create': 2,
+    'cart.download.pdf': 2,
+}
+
+
+class InProcessTransport:
+    """Запросы через django.test.Client без сети."""
+
+    name = 'in-process'
+
+    def __init__(self, token):
+        self.client = Client(
+            SERVER_NAME='localhost', raise_request_exception=False)
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {token}'}
+
+    def send(self, method, path, data=None):
+        if data is None:
+            response = self.client.generic(method, path, **self.headers)
+        else:
+            response = self.client.generic(
+                method, path, json.dumps(data),
+                content_type='application/json', **self.headers)
+        if response.streaming:
+            body = b''.join(response.streaming_content)
+        else:
+            body = response.content
+        return response.status_code, body
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу по HTTP."""
+
+    name = 'http'
+
+    def __init__(self, token, url):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {token}'
+
+    def send(self, method, path, data=None):
+        response = self.session.request(
+            method, self.url + path, json=data, timeout=60)
+        return response.status_code, response.content
+
+    def close(self):
+        self.session.close()
+
+
+class Worker:
+    """Пользователь, который выполняет случайные операции из смеси."""
+
+    def __init__(self, transport, rng, dataset, image_size, user_id):
+        self.transport = transport
+        self.rng = rng
+        self.dataset = dataset
+        self.favorites = set(dataset['favorites'].get(user_id, ()))
+        self.cart = set(dataset['carts'].get(user_id, ()))
+        self.cursor = None
+        self.image = Image.frombytes(
+            'RGB', (image_size, image_size),
+            rng.randbytes(image_size * image_size * 3))
+
+    def request(self, method, path, data=None):
+        return self.transport.send(method, path, data)
+
+    def recipe_id(self):
+        return self.rng.choice(self.dataset['recipes'])
+
+    def recipes_list(self):
+        page = self.rng.randint(1, 5)
+        return self.request('GET', f'/api/recipes/?page={page}&limit=6')
+
+    def recipes_list_filtered(self):
+        params = self.rng.choice((
+            f'tags={self.rng.choice(self.dataset["tags"])}',
+            f'author={self.rng.choice(self.dataset["authors"])}',
+            'is_favorited=1',
+            'is_in_shopping_cart=1',
+            f'search={self.rng.choice(self.dataset["words"])}',
+        ))
+        return self.request('GET', f'/api/recipes/?{params}&limit=6')
+
+    def recipes_list_cursor(self):
+        path = self.cursor or '/api/recipes/?cursor=&limit=6'
+        status, body = self.request('GET', path)
+        self.cursor = None
+        if status == 200:
+            next_link = json.loads(body)['next']
+            if next_link:
+                url = urlsplit(next_link)
+                self.cursor = f'{url.path}?{url.query}'
+        return status, body
+
+    def recipes_feed(self):
+        return self.request('GET', '/api/recipes/feed/?limit=10')
+
+    def recipes_detail(self):
+        return self.request('GET', f'/api/recipes/{self.recipe_id()}/')
+
+    def ingredients_autocomplete(self):
+        name = self.rng.choice(self.dataset['ingredients'])
+        prefix = name[:self.rng.randint(2, len(name))]
+        return self.request('GET', f'/api/ingredients/?name={prefix}')
+
+    def toggle(self, relation, chosen):
+        recipe_id = self.recipe_id()
+        path = f'/api/recipes/{recipe_id}/{relation}/'
+        if recipe_id in chosen:
+            chosen.discard(recipe_id)
+            return self.request('DELETE', path)
+        chosen.add(recipe_id)
+        return self.request('POST', path)
+
+    def favorite_toggle(self):
+        return self.toggle('favorite', self.favorites)
+
+    def cart_toggle(self):
+        return self.toggle('shopping_cart', self.cart)
+
+    def recipes_create(self):
+        self.image.putpixel((0, 0), tuple(self.rng.randbytes(3)))
+        buffer = BytesIO()
+        self.image.save(buffer, 'PNG')
+        ingredients = self.rng.sample(self.dataset['ingredient_ids'], 5)
+        return self.request('POST', '/api/recipes/', {
+            'name': 'Рецепт нагрузочного теста',
+            'text': 'Текст рецепта',
+            'cooking_time': self.rng.randint(1, 120),
+            'tags': [self.rng.choice(self.dataset['tag_ids'])],
+            'ingredients': [{'id': pk, 'amount': self.rng.randint(1, 500)}
+                            for pk in ingredients],
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(buffer.getvalue()).decode(),
+        })
+
+    def cart_download_pdf(self):
+        return self.request(
+            'GET', '/api/recipes/download_shopping_cart/?type=pdf')
+
+    def run(self, mix, deadline, max_requests, warmup):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        timings = {name: [] for name in names}
+        errors = dict.fromkeys(names, 0)
+        done = 0
+        while time.perf_counter() < deadline and done < max_requests:
+            name = self.rng.choices(names, weights)[0]
+            operation = getattr(self, name.replace('.', '_'))
+            started = time.perf_counter()
+            try:
+                status, _ = operation()
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            if warmup:
+                warmup -= 1
+                continue
+            timings[name].append(elapsed)
+            errors[name] += status >= 400
+            done += 1
+        return timings, errors
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга по отсортированным значениям."""
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def summary(timings, errors, elapsed):
+    timings = sorted(timings)
+    if not timings:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': round(len(timings) / elapsed, 2),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'max_ms': round(timings[-1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест API: наполняет базу синтетическими данными, '
+            'выполняет смесь запросов через маршруты API (в процессе или '
+            'по HTTP) и выводит p50/p95/p99 и запросы в секунду по каждой '
+            'операции в JSON. Данные удаляются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', help='Адрес запущенного сервера; без него запросы '
+                          'выполняются в процессе. Сервер должен работать '
+                          'с той же базой.')
+        parser.add_argument(
+            '-c', '--concurrency', type=int, default=1,
+            help='Параллельных пользователей')
+        parser.add_argument(
+            '-d', '--duration', type=float, default=10,
+            help='Длительность замера, с')
+        parser.add_argument(
+            '-n', '--requests', type=int, default=math.inf,
+            help='Предельное число запросов на пользователя')
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Запросов на пользователя до начала замера')
+        parser.add_argument(
+            '--mix', nargs='+', default=[], metavar='OPERATION=WEIGHT',
+            help=f'Веса операций вместо стандартных: {", ".join(MIX)}')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--follows', type=int, default=20, help='Подписок у пользователя')
+        parser.add_argument(
+            '--cart', type=int, default=20, help='Рецептов в корзине')
+        parser.add_argument(
+            '--favorites', type=int, default=50, help='Рецептов в избранном')
+        parser.add_argument(
+            '--image-size', type=int, default=256,
+            help='Сторона изображения создаваемых рецептов, px')
+        parser.add_argument('-o', '--output', help='Файл для отчёта JSON')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        if options['concurrency'] > options['users']:
+            raise CommandError('Пользователей меньше, чем --concurrency')
+        random.seed(options['seed'])
+        prefix = f'bench{os.getpid()}x'
+        try:
+            users, dataset = self.populate(prefix, options)
+            report = self.run(users, dataset, mix, options)
+        finally:
+            self.cleanup(prefix)
+        report = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(report + '\n')
+        self.stdout.write(report)
+
+    def parse_mix(self, items):
+        mix = dict(MIX)
+        if items:
+            mix = dict.fromkeys(MIX, 0)
+        for item in items:
+            name, _, weight = item.partition('=')
+            if name not in MIX or not weight.replace('.', '', 1).isdigit():
+                raise CommandError(f'Неверная операция смеси: {item}')
+            mix[name] = float(weight)
+        return {name: weight for name, weight in mix.items() if weight > 0}
+
+    @transaction.atomic
+    def populate(self, prefix, options):
+        started = time.perf_counter()
+        users = seed.create_users(options['users'], prefix=prefix)
+        authors = users[:options['authors']]
+        tags = seed.create_tags(options['tags'], prefix=prefix)
+        ingredients = seed.create_ingredients(
+            options['ingredients'], prefix=prefix)
+        recipes = seed.create_recipes(
+            authors, options['recipes'], tags, ingredients, 8)
+        seed.create_subscriptions(users, authors, options['follows'])
+        carts, favorites = {}, {}
+        for user in users[:options['concurrency']]:
+            cart = random.sample(recipes, options['cart'])
+            seed.fill_cart(user, cart)
+            carts[user.id] = [recipe.id for recipe in cart]
+            chosen = random.sample(recipes, options['favorites'])
+            seed.fill_favorites(user, chosen)
+            favorites[user.id] = [recipe.id for recipe in chosen]
+        Token.objects.bulk_create(
+            Token(key=Token.generate_key(), user=user) for user in users)
+        feed.rebuild([user.id for user in users])
+        seeded = Recipe.objects.filter(author__in=authors)
+        seeded.update(
+            favorites_count=count_subquery(Favorite.objects.all(), 'recipe'),
+            in_carts_count=count_subquery(
+                ShoppingCart.objects.all(), 'recipe'),
+        )
+        User.objects.filter(pk__in=[author.pk for author in authors]).update(
+            recipes_count=count_subquery(Recipe.objects.all(), 'author'))
+        update_search_vectors(seeded)
+        bump_model_version(Tag)
+        bump_model_version(Ingredient)
+        self.stderr.write(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с')
+        dataset = {
+            'recipes': [recipe.id for recipe in recipes],
+            'authors': [author.id for author in authors],
+            'tags': [tag.slug for tag in tags],
+            'tag_ids': [tag.id for tag in tags],
+            'ingredients': [ingredient.name for ingredient in ingredients],
+            'ingredient_ids': [ingredient.id for ingredient in ingredients],
+            'words': ['рецепт', 'текст', 'рецепт 1'],
+            'carts': carts,
+            'favorites': favorites,
+        }
+        return users, dataset
+
+    def run(self, users, dataset, mix, options):
+        tokens = dict(Token.objects.filter(
+            user__in=users[:options['concurrency']],
+        ).values_list('user_id', 'key'))
+        barrier = threading.Barrier(options['concurrency'])
+        deadline = None
+
+        def work(index):
+            nonlocal deadline
+            token = tokens[users[index].id]
+            if options['url']:
+                transport = HttpTransport(token, options['url'])
+            else:
+                transport = InProcessTransport(token)
+            worker = Worker(
+                transport, random.Random(options['seed'] + index),
+                dataset, options['image_size'], users[index].id)
+            try:
+                barrier.wait()
+                if deadline is None:
+                    deadline = time.perf_counter() + options['duration']
+                return worker.run(
+                    mix, deadline, options['requests'], options['warmup'])
+            finally:
+                transport.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(work, range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+
+        endpoints = {}
+        for name in mix:
+            timings = [t for result, _ in results for t in result[name]]
+            errors = sum(result[name] for _, result in results)
+            endpoints[name] = summary(timings, errors, elapsed)
+        everything = [t for result, _ in results
+                      for values in result.values() for t in values]
+        return {
+            'config': {
+                'transport': 'http' if options['url'] else 'in-process',
+                'database': connection.vendor,
+                'mix': mix,
+                **{key: options[key] for key in (
+                    'url', 'concurrency', 'duration', 'warmup', 'seed',
+                    'users', 'authors', 'recipes', 'ingredients', 'tags',
+                    'follows', 'cart', 'favorites', 'image_size')},
+            },
+            'total': summary(everything, sum(
+                sum(result.values()) for _, result in results), elapsed),
+            'endpoints': endpoints,
+        }
+
+    def cleanup(self, prefix):
+        """Удаление созданных данных и файлов новых рецептов."""
+        users = User.objects.filter(username__startswith=prefix)
+        created = Recipe.objects.filter(author__in=users).exclude(
+            image=seed.IMAGE).values_list('image', 'image_renditions')
+        files = set()
+        for image, renditions in created:
+            files.add(image)
+            for rendition in renditions.values():
+                if isinstance(rendition, dict):
+                    files.update(rendition.values())
+        with transaction.atomic():
+            Recipe.objects.filter(author__in=users).delete()
+            users.delete()
+            Tag.objects.filter(name__startswith=prefix).delete()
+            Ingredient.objects.filter(name__startswith=prefix).delete()
+        for name in files:
+            default_storage.delete(name)
+        bump_model_version(Tag)
+        bump_model_version(Ingredient)
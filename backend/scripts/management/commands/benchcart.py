@@ -0,0 +1,56 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from recipes.services import get_cart_ingredients
+from scripts import seed
+
+
+class Command(BaseCommand):
+    help = ('Замер агрегации списка покупок на корзинах разного размера. '
+            'Данные создаются в транзакции и откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 300, 1000],
+            help='Количество рецептов в корзине')
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Размер каталога ингредиентов')
+        parser.add_argument(
+            '--per-recipe', type=int, default=10,
+            help='Ингредиентов в рецепте')
+        parser.add_argument(
+            '--repeat', type=int, default=5, help='Повторов замера')
+        parser.add_argument(
+            '--explain', action='store_true', help='Показать план запроса')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, sizes, ingredients, per_recipe, repeat, explain, **kwargs):
+        author, *buyers = seed.create_users(len(sizes) + 1, prefix='bench')
+        tags = seed.create_tags(3, prefix='bench')
+        catalog = seed.create_ingredients(ingredients, prefix='bench')
+        recipes = seed.create_recipes(
+            [author], max(sizes), tags, catalog, per_recipe)
+        self.stdout.write(f'{"recipes":>8} {"rows":>6} {"queries":>8} '
+                          f'{"median, ms":>11} {"max, ms":>8}')
+        for buyer, size in zip(buyers, sizes):
+            seed.fill_cart(buyer, recipes[:size])
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    rows = list(get_cart_ingredients(buyer))
+                    timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{size:>8} {len(rows):>6} {len(queries):>8} '
+                f'{statistics.median(timings):>11.2f} {max(timings):>8.2f}')
+        if explain:
+            self.stdout.write(get_cart_ingredients(buyers[-1]).explain())
@@ -0,0 +1,101 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from recipes import feed
+from recipes.models import Recipe
+from scripts import seed
+
+
+def measure(func, *args):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        func(*args)
+        elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, len(queries)
+
+
+class Command(BaseCommand):
+    help = ('Замер ленты подписок на синтетическом графе подписчиков '
+            'при разных порогах раздачи FEED_FANOUT_LIMIT: размер таблицы '
+            'лент, стоимость публикации рецепта и чтения ленты. Данные '
+            'создаются в транзакции и откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=5000, help='Читателей')
+        parser.add_argument(
+            '--authors', type=int, default=500, help='Авторов')
+        parser.add_argument(
+            '--follows', type=int, default=50,
+            help='Подписок у читателя (до удаления повторов)')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель распределения Ципфа для популярности авторов')
+        parser.add_argument(
+            '--recipes', type=int, default=20000, help='Рецептов')
+        parser.add_argument(
+            '--limits', type=int, nargs='+', default=[0, 100, 1000, 10 ** 9],
+            help='Пороги раздачи: 0 - только чтение, больше числа '
+                 'читателей - только раздача')
+        parser.add_argument(
+            '--page', type=int, default=10, help='Размер страницы ленты')
+        parser.add_argument(
+            '--repeat', type=int, default=20, help='Повторов замера')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            transaction.set_rollback(True)
+
+    def run(self, users, authors, follows, skew, recipes, limits, page,
+            repeat, **kwargs):
+        readers = seed.create_users(users, prefix='benchreader')
+        writers = seed.create_users(authors, prefix='benchauthor')
+        tags = seed.create_tags(3, prefix='bench')
+        catalog = seed.create_ingredients(10, prefix='bench')
+        seed.create_recipes(writers, recipes, tags, catalog, 2)
+        seed.create_subscriptions(readers, writers, follows, skew)
+        counts = sorted(writer.followers_count for writer in writers)
+        self.stdout.write(
+            f'подписчиков у автора: max {counts[-1]}, '
+            f'median {statistics.median(counts):.0f}, min {counts[0]}')
+        top = max(writers, key=lambda writer: writer.followers_count)
+        typical = sorted(
+            writers, key=lambda writer: writer.followers_count
+        )[len(writers) // 2]
+        sample = random.sample(readers, min(repeat, len(readers)))
+
+        self.stdout.write(
+            f'{"limit":>10} {"entries":>9} {"rebuild, s":>10} '
+            f'{"write top":>10} {"write med":>10} '
+            f'{"read, ms":>9} {"p95, ms":>8} {"queries":>8}')
+        for limit in limits:
+            with override_settings(FEED_FANOUT_LIMIT=limit):
+                started = time.perf_counter()
+                entries = feed.rebuild()
+                rebuilt = time.perf_counter() - started
+                writes = {}
+                for author in (top, typical):
+                    new = Recipe.objects.bulk_create(
+                        Recipe(author=author, name='Новый', text='Текст',
+                               cooking_time=1, image=seed.IMAGE)
+                        for _ in range(repeat))
+                    writes[author] = statistics.median(
+                        measure(feed.fan_out_recipe, recipe)[0]
+                        for recipe in new)
+                    Recipe.objects.filter(
+                        pk__in=[recipe.pk for recipe in new]).delete()
+                reads = [measure(feed.get_feed, reader, None, page)
+                         for reader in sample]
+            timings = sorted(elapsed for elapsed, _ in reads)
+            self.stdout.write(
+                f'{limit:>10} {entries:>9} {rebuilt:>10.2f} '
+                f'{writes[top]:>10.2f} {writes[typical]:>10.2f} '
+                f'{statistics.median(timings):>9.2f} '
+                f'{timings[int(len(timings) * 0.95)]:>8.2f} '
+                f'{max(queries for _, queries in reads):>8}')
@@ -0,0 +1,92 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.management.commands.loadmodels import is_header
+from recipes.models import Ingredient
+from recipes.services import bump_model_version
+
+STAGING_TABLE = 'ingredient_staging'
+
+
+class Command(BaseCommand):
+    help = 'Быстрая загрузка ингредиентов из .csv (название, единица).'
+
+    def add_arguments(self, parser):
+        """Аргументы для пути к файлу .csv и формата файла."""
+        parser.add_argument('path', type=str, help='Путь к файлу .csv')
+        parser.add_argument(
+            '--header', action='store_true',
+            help='Первая строка файла - заголовок, даже если её поля '
+                 'не name и measurement_unit')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пакета вставки, если база не PostgreSQL')
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            self.skip_header(file, kwargs['header'])
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    added = self.copy(file)
+                else:
+                    added = self.insert(file, kwargs['batch_size'])
+        bump_model_version(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено ингредиентов: {added} '
+            f'за {time.perf_counter() - started:.2f} с'))
+
+    def skip_header(self, file, header):
+        """
+        Пропуск заголовка одинаково для COPY и пакетной вставки: первая
+        строка пропускается с --header или если это name и
+        measurement_unit, как в loadmodels.
+        """
+        first = file.readline()
+        if not (header or is_header(next(csv.reader([first]), []))):
+            file.seek(0)
+
+    def copy(self, file):
+        """
+        COPY во временную таблицу и перенос новых строк одним запросом.
+        Файл передаётся в базу потоком, память не зависит от его размера.
+        """
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {STAGING_TABLE} '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (name, measurement_unit) FROM STDIN '
+                'WITH (FORMAT csv)',
+                file,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT btrim(name), btrim(measurement_unit) '
+                f'FROM {STAGING_TABLE} '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            added = cursor.rowcount
+            # ON COMMIT DROP не сработает, если команда выполняется
+            # внутри внешней транзакции, например дважды подряд
+            cursor.execute(f'DROP TABLE {STAGING_TABLE}')
+            return added
+
+    def insert(self, file, batch_size):
+        """Пакетная вставка для баз без COPY, например SQLite."""
+        before = Ingredient.objects.count()
+        batch = []
+        for name, measurement_unit in csv.reader(file):
+            batch.append(Ingredient(
+                name=name.strip(),
+                measurement_unit=measurement_unit.strip(),
+            ))
+            if len(batch) == batch_size:
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        return Ingredient.objects.count() - before
@@ -0,0 +1,110 @@
+"""Быстрое наполнение базы синтетическими данными для бенчмарков."""
+import random
+from collections import Counter
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription, User
+
+BATCH_SIZE = 1000
+IMAGE = 'recipes/seed.png'
+
+
+def create_users(count, prefix='seed'):
+    return User.objects.bulk_create(
+        (User(
+            username=f'{prefix}{i}',
+            email=f'{prefix}{i}@example.com',
+            first_name='Seed',
+            last_name=str(i),
+        ) for i in range(count)),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def create_tags(count, prefix='seed'):
+    return Tag.objects.bulk_create(
+        Tag(
+            name=f'{prefix}{i}',
+            color=f'#{random.randrange(16 ** 6):06x}',
+            slug=f'{prefix}-{i}',
+        ) for i in range(count)
+    )
+
+
+def create_ingredients(count, prefix='seed'):
+    return Ingredient.objects.bulk_create(
+        (Ingredient(name=f'{prefix} {i}', measurement_unit='г')
+         for i in range(count)),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def create_recipes(authors, count, tags, ingredients, ingredients_per_recipe):
+    """Рецепты со случайными тегами и ингредиентами."""
+    recipes = Recipe.objects.bulk_create(
+        (Recipe(
+            author=random.choice(authors),
+            name=f'Рецепт {i}',
+            text='Текст рецепта',
+            cooking_time=random.randint(1, 120),
+            image=IMAGE,
+        ) for i in range(count)),
+        batch_size=BATCH_SIZE,
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe=recipe, tag=random.choice(tags))
+         for recipe in recipes),
+        batch_size=BATCH_SIZE,
+    )
+    IngredientAmount.objects.bulk_create(
+        (IngredientAmount(recipe=recipe, ingredient=ingredient,
+                          amount=random.randint(1, 500))
+         for recipe in recipes
+         for ingredient in random.sample(ingredients,
+                                         ingredients_per_recipe)),
+        batch_size=BATCH_SIZE,
+    )
+    return recipes
+
+
+def fill_cart(user, recipes):
+    ShoppingCart.objects.bulk_create(
+        (ShoppingCart(user=user, recipe=recipe) for recipe in recipes),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def fill_favorites(user, recipes):
+    Favorite.objects.bulk_create(
+        (Favorite(user=user, recipe=recipe) for recipe in recipes),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def create_subscriptions(users, authors, per_user, skew=1.0):
+    """
+    Подписки с популярностью авторов по закону Ципфа: автор с номером
+    k получает долю подписчиков, пропорциональную 1 / k ** skew.
+    Обновляет счётчики подписчиков авторов.
+    """
+    weights = [1 / (rank + 1) ** skew for rank in range(len(authors))]
+    subscriptions = []
+    for user in users:
+        chosen = set(random.choices(authors, weights, k=per_user))
+        subscriptions += [
+            Subscription(user=user, author=author)
+            for author in chosen if author != user]
+    Subscription.objects.bulk_create(subscriptions, batch_size=BATCH_SIZE)
+    counts = Counter(item.author_id for item in subscriptions)
+    for author in authors:
+        author.followers_count = counts[author.id]
+    User.objects.bulk_update(
+        authors, ['followers_count'], batch_size=BATCH_SIZE)
+    return subscriptions
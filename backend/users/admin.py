@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Q
 
 from recipes.models import (
     Favorite,
@@ -10,6 +11,7 @@ from recipes.models import (
     Ingredient,
     Tag
 )
+from recipes.search import search_recipes
 
 from .models import Subscription, User
 
@@ -65,12 +67,27 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     exclude = ('ingredients',)
     inlines = (IngredientAmountInline,)
+    list_select_related = ('author',)
     list_filter = ('author', 'name', 'tags')
-    search_fields = ('author__username', 'name', 'tags__name')
+    search_fields = ('author__username', 'tags__name')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Полнотекстовый поиск по названию и тексту или совпадение
+        с именем автора или названием тега.
+        """
+        if not search_term:
+            return queryset, False
+        related, _ = super().get_search_results(
+            request, queryset, search_term)
+        return queryset.filter(
+            Q(pk__in=search_recipes(queryset, search_term).values('pk'))
+            | Q(pk__in=related.values('pk'))), False
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def count_added(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 class IngredientAmountAdmin(admin.ModelAdmin):